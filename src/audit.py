@@ -0,0 +1,186 @@
+import argparse
+import collections
+import concurrent.futures
+import dataclasses
+import fnmatch
+import json
+import logging
+import os
+import re
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import src.batch as batch
+import src.data as data
+import src.reconcile as reconcile
+
+MISMATCH_PATTERN = re.compile(r"Error\. (.+?) mismatch")
+
+
+@dataclasses.dataclass
+class AuditSummary:
+    files: int = 0
+    files_failed: int = 0
+    requests: int = 0
+    requests_invalid: int = 0
+    rows: int = 0
+    validation_failures: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    reconciliation_failures: int = 0
+    debt_types: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    kbk_rows: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    kbk_totals: Dict[str, Decimal] = dataclasses.field(
+        default_factory=lambda: collections.defaultdict(Decimal)
+    )
+    nds_rows: int = 0
+
+    def merge(self, other: "AuditSummary") -> None:
+        self.files += other.files
+        self.files_failed += other.files_failed
+        self.requests += other.requests
+        self.requests_invalid += other.requests_invalid
+        self.rows += other.rows
+        self.validation_failures.update(other.validation_failures)
+        self.reconciliation_failures += other.reconciliation_failures
+        self.debt_types.update(other.debt_types)
+        self.kbk_rows.update(other.kbk_rows)
+        for kbk, total in other.kbk_totals.items():
+            self.kbk_totals[kbk] += total
+        self.nds_rows += other.nds_rows
+
+    def to_json(self) -> dict:
+        return {
+            "files": self.files,
+            "files_failed": self.files_failed,
+            "requests": self.requests,
+            "requests_invalid": self.requests_invalid,
+            "rows": self.rows,
+            "validation_failures": dict(self.validation_failures),
+            "reconciliation_failures": self.reconciliation_failures,
+            "debt_types": dict(self.debt_types),
+            "kbk_rows": dict(self.kbk_rows),
+            "kbk_totals": {
+                kbk: str(total)
+                for kbk, total in sorted(self.kbk_totals.items())
+            },
+            "nds_rows": self.nds_rows,
+        }
+
+
+class MismatchCollector(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__(level=logging.ERROR)
+        self.failures: collections.Counter = collections.Counter()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        match = MISMATCH_PATTERN.search(record.getMessage())
+        if match:
+            self.failures[match.group(1)] += 1
+
+
+def find_sample_files(root_folder: str, pattern: str) -> List[str]:
+    return sorted(
+        os.path.join(folder, file_name)
+        for folder, _, file_names in os.walk(root_folder)
+        for file_name in file_names
+        if fnmatch.fnmatch(file_name, pattern)
+    )
+
+
+def audit_file(sample_json_path: str) -> AuditSummary:
+    summary = AuditSummary(files=1)
+
+    collector = MismatchCollector()
+    logger = logging.getLogger()
+    level = logger.level
+    logger.addHandler(collector)
+    # NOTE: data.parse_request пишет причины в корневой логгер
+    logger.setLevel(min(level, logging.ERROR))
+    try:
+        requests = data.load_json_requests(sample_json_path)
+    except (OSError, ValueError) as error:
+        logging.warning(f"Failed to audit {sample_json_path}: {error}")
+        summary.files_failed = 1
+        return summary
+    finally:
+        logger.removeHandler(collector)
+        logger.setLevel(level)
+
+    valid_requests = [request for request in requests if request]
+    summary.requests = len(requests)
+    summary.requests_invalid = len(requests) - len(valid_requests)
+    summary.validation_failures = collector.failures
+
+    row_batch = batch.RowBatch.from_requests(valid_requests)
+    kbk, _ = row_batch.kbk()
+    summary.rows = len(row_batch)
+    summary.debt_types.update(row_batch.debt_types().tolist())
+    summary.kbk_rows.update(kbk.tolist())
+    summary.nds_rows = int(row_batch.with_nds().sum())
+
+    for row, row_kbk in zip(row_batch.rows, kbk.tolist()):
+        amount = reconcile.to_decimal(row.sum_tenge)
+        if amount is not None:
+            summary.kbk_totals[row_kbk] += amount
+
+    summary.reconciliation_failures = sum(
+        not reconcile.reconcile(request).ok for request in valid_requests
+    )
+    return summary
+
+
+def audit(
+    root_folder: str,
+    pattern: str = "sample*.json",
+    workers: Optional[int] = None,
+) -> AuditSummary:
+    paths = find_sample_files(root_folder, pattern)
+    summary = AuditSummary()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for file_summary in pool.map(
+            audit_file,
+            paths,
+            chunksize=max(
+                1, len(paths) // ((workers or os.cpu_count() or 1) * 4)
+            ),
+        ):
+            summary.merge(file_summary)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Audit archived sample.json files"
+    )
+    parser.add_argument("root", help="folder with archived sample files")
+    parser.add_argument("--pattern", default="sample*.json")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", help="write the summary to a json file")
+    args = parser.parse_args()
+
+    console = logging.StreamHandler()
+    console.setLevel(logging.CRITICAL)
+    logging.basicConfig(handlers=[console])
+
+    start = time.perf_counter()
+    summary = audit(args.root, pattern=args.pattern, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    summary_json = summary.to_json()
+    summary_json["elapsed_seconds"] = round(elapsed, 3)
+    text = json.dumps(summary_json, indent=4, ensure_ascii=False)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import dataclasses
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+import src.data as data
+
+ColvirRow = Tuple[data.Row, str, str, bool]
+
+
+def to_amounts(values: List[str]) -> np.ndarray:
+    amounts = np.full(len(values), np.nan, dtype=np.float64)
+    for i, value in enumerate(values):
+        if data.is_num(value):
+            amounts[i] = float(value.replace(" ", ""))
+    return amounts
+
+
+@dataclasses.dataclass
+class RowBatch:
+    order_index: np.ndarray
+    name: np.ndarray
+    name_lower: np.ndarray
+    document: np.ndarray
+    amount: np.ndarray
+    currency: np.ndarray
+    rk: np.ndarray
+    ppz: np.ndarray
+    rows: np.ndarray
+    offsets: np.ndarray
+
+    @classmethod
+    def from_requests(cls, requests: List[data.Request]) -> "RowBatch":
+        rows = [row for request in requests for row in request.rows]
+        counts = np.array(
+            [len(request.rows) for request in requests], dtype=np.int64
+        )
+        order_index = np.repeat(
+            np.arange(len(requests), dtype=np.int32), counts
+        )
+
+        name = np.array([row.name for row in rows], dtype=np.str_)
+        row_objects = np.empty(len(rows), dtype=object)
+        row_objects[:] = rows
+
+        return cls(
+            order_index=order_index,
+            name=name,
+            name_lower=np.char.lower(name),
+            document=np.array(
+                [row.name_num_date for row in rows], dtype=np.str_
+            ),
+            amount=to_amounts([row.sum_tenge for row in rows]),
+            currency=np.array([row.currency for row in rows], dtype=np.str_),
+            rk=np.repeat(
+                np.array([request.rk for request in requests], dtype=bool),
+                counts,
+            ),
+            ppz=np.repeat(
+                np.array([request.ppz for request in requests], dtype=bool),
+                counts,
+            ),
+            rows=row_objects,
+            offsets=np.concatenate(([0], np.cumsum(counts))),
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def request_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def view(self, request_index: int) -> "RowBatch":
+        start = self.offsets[request_index]
+        stop = self.offsets[request_index + 1]
+        return RowBatch(
+            order_index=self.order_index[start:stop],
+            name=self.name[start:stop],
+            name_lower=self.name_lower[start:stop],
+            document=self.document[start:stop],
+            amount=self.amount[start:stop],
+            currency=self.currency[start:stop],
+            rk=self.rk[start:stop],
+            ppz=self.ppz[start:stop],
+            rows=self.rows[start:stop],
+            offsets=np.array([0, stop - start]),
+        )
+
+    def contains(self, *words: str) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        for word in words:
+            mask |= np.char.find(self.name_lower, word) >= 0
+        return mask
+
+    def with_nds(self) -> np.ndarray:
+        return self.contains("с ндс")
+
+    def debt_types(self) -> np.ndarray:
+        return np.select(
+            [
+                self.contains("проезд", "сервисный"),
+                ~self.ppz & self.contains("суточные", "проживание"),
+            ],
+            ["10", "39"],
+            default="2",
+        )
+
+    def assign_debt_types(self) -> None:
+        for row, debt_type in zip(self.rows, self.debt_types()):
+            row.debt_type = str(debt_type)
+
+    def kbk(self) -> Tuple[np.ndarray, np.ndarray]:
+        rk = self.rk
+        daily = self.contains("суточные")
+        travel = self.contains("проезд")
+        living = self.contains("проживание")
+        fine = self.contains("штраф")
+        cancel = self.contains("отмена")
+        over_norm = self.contains("сверх норм")
+
+        conditions = [
+            ~rk & daily,
+            ~rk & travel,
+            ~rk & living,
+            ~rk & fine,
+            ~rk & cancel,
+            ~rk & over_norm,
+            ~rk,
+            rk & daily,
+            rk & travel,
+            rk & living,
+            rk & fine,
+            rk & cancel,
+        ]
+        kbk = np.select(
+            conditions,
+            [
+                "80302020201",
+                "80302020202",
+                "80302020203",
+                "80213",
+                "803030903",
+                "80302020301",
+                "70302020204",
+                "70302020101",
+                "70302020102",
+                "70302020103",
+                "80213",
+                "803030903",
+            ],
+            default="70302020104",
+        )
+        budget_type = np.select(
+            conditions,
+            [
+                "EXC",
+                "EXC",
+                "EXC",
+                "EXC",
+                "EXC",
+                "EXC",
+                "CPC",
+                "CPC",
+                "CPC",
+                "CPC",
+                "EXC",
+                "EXC",
+            ],
+            default="CPC",
+        )
+        return kbk, budget_type
+
+    def invalid(self) -> np.ndarray:
+        return np.isnan(self.amount) | (self.currency != "KZT")
+
+    def totals(self) -> np.ndarray:
+        cumulative = np.concatenate(
+            ([0.0], np.cumsum(np.nan_to_num(self.amount)))
+        )
+        return cumulative[self.offsets[1:]] - cumulative[self.offsets[:-1]]
+
+    def colvir_rows(self) -> Iterator[ColvirRow]:
+        kbk, budget_type = self.kbk()
+        for row, row_kbk, row_budget_type, row_with_nds in zip(
+            self.rows, kbk, budget_type, self.with_nds()
+        ):
+            yield row, str(row_kbk), str(row_budget_type), bool(row_with_nds)
+
+    def find(self, name: str) -> int:
+        return int(np.flatnonzero(self.name == name)[0])
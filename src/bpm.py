@@ -1,36 +1,369 @@
+import argparse
+import concurrent.futures
 import dataclasses
+import functools
+import html.parser
 import json
 import logging
+import os
+import queue
+import statistics
+import threading
 import time
-from typing import Dict, List, Optional, Union
-
+import urllib.parse
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import requests as http
 import selenium.webdriver.chrome.service as chrome_service
-from selenium.common import NoSuchElementException
+from selenium.common import (
+    NoSuchElementException,
+    TimeoutException,
+    WebDriverException,
+)
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as ec
 from selenium.webdriver.support.wait import WebDriverWait
 
+import src.batch as batch
 import src.data as data
+import src.metrics as metrics
+import src.retry as retry
+import src.snapshot as snapshot
 
 Sample = Dict[str, List[Union[str, int, List[List[str]]]]]
+FieldReader = Callable[[str, str, Optional[str]], str]
+JSON = Dict[str, Any]
+
+BPM_URL = "https://bpm.kdb.kz"
+LIST_PARAMS = {"s": "obj_a", "gid": "873"}
+STATE_COLUMN_ID = "4680"
+STATE = "На исполнении (НУ ДБУ)"
+PAGE_PARAM = "page"
+FILTER_PARAM = "filter[{column_id}]"
+MAX_PAGES = 200
+LINK_SELECTOR = ".js_dbl_click_text_select.js_list_dflt_col_5 > a"
+
+# NOTE: stylesheets are kept, WebElement.text depends on computed visibility
+BLOCKED_URL_PATTERNS = [
+    f"*.{extension}"
+    for extension in [
+        "png",
+        "jpg",
+        "jpeg",
+        "gif",
+        "svg",
+        "ico",
+        "webp",
+        "bmp",
+        "woff",
+        "woff2",
+        "ttf",
+        "otf",
+        "eot",
+        "mp3",
+        "mp4",
+        "webm",
+    ]
+]
+
+
+@dataclasses.dataclass
+class ListEntry:
+    url: str
+    text: str
+
+
+class ListParser(html.parser.HTMLParser):
+    def __init__(self) -> None:
+        super().__init__()
+        self.entries: List[Tuple[str, str]] = []
+        self.rows = 0
+        self.in_row = False
+        self.has_cells = False
+        self.in_link_cell = False
+        self.href: Optional[str] = None
+        self.texts: List[str] = []
+
+    def handle_starttag(
+        self, tag: str, attrs: List[Tuple[str, Optional[str]]]
+    ) -> None:
+        attributes = dict(attrs)
+        if tag == "tr":
+            self.in_row = True
+            self.has_cells = False
+            self.in_link_cell = False
+            self.href = None
+            self.texts = []
+        elif tag == "td" and self.in_row:
+            self.has_cells = True
+            classes = (attributes.get("class") or "").split()
+            self.in_link_cell = (
+                "js_dbl_click_text_select" in classes
+                and "js_list_dflt_col_5" in classes
+            )
+        elif tag == "a" and self.in_link_cell and self.href is None:
+            self.href = attributes.get("href")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "td":
+            self.in_link_cell = False
+        elif tag == "tr" and self.in_row:
+            if self.has_cells:
+                self.rows += 1
+            if self.href:
+                self.entries.append((self.href, " ".join(self.texts)))
+            self.in_row = False
+
+    def handle_data(self, text: str) -> None:
+        if self.in_row and text.strip():
+            self.texts.append(text.strip())
+
+
+def parse_list_page(
+    page_source: str, base_url: str, state: Optional[str] = None
+) -> List[ListEntry]:
+    parser = ListParser()
+    parser.feed(page_source)
+    entries = [
+        ListEntry(url=urllib.parse.urljoin(base_url, href), text=text)
+        for href, text in parser.entries
+        if state is None or state in text
+    ]
+    if parser.rows and not entries:
+        logging.warning(
+            f"List page has {parser.rows} rows but none parsed for {state=}"
+        )
+    return entries
+
+
+def list_page_url(base_url: str, page: int, state: str) -> str:
+    params = {
+        **LIST_PARAMS,
+        FILTER_PARAM.format(column_id=STATE_COLUMN_ID): state,
+        PAGE_PARAM: page,
+    }
+    return f"{base_url}/?{urllib.parse.urlencode(params)}"
+
+
+def apply_state_filter(driver: Chrome, wait: WebDriverWait, state: str) -> None:
+    state_filter_input = wait.until(
+        ec.presence_of_element_located(
+            (By.CSS_SELECTOR, f'[data-col-id="{STATE_COLUMN_ID}"]')
+        )
+    )
+    stale_links = driver.find_elements(By.CSS_SELECTOR, LINK_SELECTOR)[:1]
+    state_filter_input.send_keys(state)
+
+    try:
+        if stale_links:
+            wait.until(ec.staleness_of(stale_links[0]))
+        wait.until(
+            ec.presence_of_element_located((By.CSS_SELECTOR, LINK_SELECTOR))
+        )
+    except TimeoutException:
+        logging.warning(f"No requests listed for {state=}")
+
+
+def get_page(session: http.Session, url: str) -> http.Response:
+    with metrics.BPM_PAGE_SECONDS.time(page="list"):
+        response = session.get(url, timeout=30)
+    response.raise_for_status()
+    return response
+
+
+def fetch_list_pages(
+    session: http.Session,
+    base_url: str,
+    state: str,
+    entries: "queue.Queue[Optional[ListEntry]]",
+    start_page: int = 2,
+) -> None:
+    seen = set()
+    try:
+        for page in range(start_page, MAX_PAGES + 1):
+            response = retry.call(
+                "bpm",
+                get_page,
+                session,
+                list_page_url(base_url, page, state),
+                retry_on=(http.RequestException,),
+            )
+
+            new_entries = [
+                entry
+                for entry in parse_list_page(response.text, base_url, state)
+                if entry.url not in seen
+            ]
+            if not new_entries:
+                break
+
+            for entry in new_entries:
+                seen.add(entry.url)
+                entries.put(entry)
+    except retry.RetryError as error:
+        logging.exception(error)
+    finally:
+        entries.put(None)
 
 
-def driver_init(executable_path: str) -> Chrome:
+def http_session(driver: Chrome) -> http.Session:
+    session = http.Session()
+    session.headers["User-Agent"] = driver.execute_script(
+        "return navigator.userAgent"
+    )
+    for cookie in driver.get_cookies():
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+
+def cookie_session(cookies_path: str) -> Optional[http.Session]:
+    if not os.path.exists(cookies_path):
+        return None
+
+    with open(cookies_path, "r", encoding="utf-8") as f:
+        cookies = json.load(f)
+
+    session = http.Session()
+    for cookie in cookies:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+
+def poll_list(
+    cookies_path: str, base_url: str = BPM_URL, state: str = STATE
+) -> Optional[List[ListEntry]]:
+    session = cookie_session(cookies_path)
+    if session is None:
+        return None
+
+    entries: List[ListEntry] = []
+    seen = set()
+    for page in range(1, MAX_PAGES + 1):
+        response = retry.call(
+            "bpm",
+            get_page,
+            session,
+            list_page_url(base_url, page, state),
+            retry_on=(http.RequestException,),
+        )
+        if (
+            page == 1
+            and f'data-col-id="{STATE_COLUMN_ID}"' not in response.text
+        ):
+            logging.info("BPM session expired")
+            return None
+
+        new_entries = [
+            entry
+            for entry in parse_list_page(response.text, base_url, state)
+            if entry.url not in seen
+        ]
+        if not new_entries:
+            break
+
+        for entry in new_entries:
+            seen.add(entry.url)
+            entries.append(entry)
+    return entries
+
+
+def iter_list_entries(
+    driver: Chrome,
+    wait: WebDriverWait,
+    base_url: str = BPM_URL,
+    state: str = STATE,
+) -> Iterator[ListEntry]:
+    apply_state_filter(driver=driver, wait=wait, state=state)
+    first_page = parse_list_page(driver.page_source, base_url, state)
+
+    entries: "queue.Queue[Optional[ListEntry]]" = queue.Queue()
+    pager = threading.Thread(
+        target=fetch_list_pages,
+        args=(http_session(driver), base_url, state, entries),
+        name="BpmListPager",
+        daemon=True,
+    )
+    pager.start()
+
+    seen = set()
+    for entry in first_page:
+        seen.add(entry.url)
+        yield entry
+
+    while (entry := entries.get()) is not None:
+        if entry.url in seen:
+            continue
+        seen.add(entry.url)
+        yield entry
+
+
+def driver_init(
+    executable_path: str,
+    profile: str = "default",
+    user_data_dir: Optional[str] = None,
+) -> Chrome:
     service = chrome_service.Service(executable_path=executable_path)
     options = ChromeOptions()
     prefs = {"profile.default_content_setting_values.notifications": 2}
+
+    if profile == "fast":
+        prefs["profile.managed_default_content_settings.images"] = 2
+        options.page_load_strategy = "eager"
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-gpu")
+    elif profile == "default":
+        options.add_argument("--start-maximized")
+    else:
+        raise ValueError(f"Unknown driver profile: {profile}")
+
+    if user_data_dir:
+        os.makedirs(user_data_dir, exist_ok=True)
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+
     options.add_experimental_option("prefs", prefs)
-    options.add_argument("--start-maximized")
     driver = Chrome(service=service, options=options)
+
+    if profile == "fast":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS}
+        )
+
     return driver
 
 
 def login(
-    driver: Chrome, wait: WebDriverWait, bpm_user: str, bpm_password
+    driver: Chrome,
+    wait: WebDriverWait,
+    bpm_user: str,
+    bpm_password,
+    base_url: str = BPM_URL,
 ) -> None:
-    driver.get("https://bpm.kdb.kz/?s=obj_a&gid=873&reset_page=1")
+    driver.get(f"{base_url}/?s=obj_a&gid=873&reset_page=1")
 
     user_input = wait.until(
         ec.presence_of_element_located((By.NAME, "u_login"))
@@ -46,6 +379,106 @@ def login(
     submit_button.click()
 
 
+def is_logged_in(driver: Chrome, wait: WebDriverWait) -> bool:
+    try:
+        element = wait.until(
+            ec.presence_of_element_located(
+                (
+                    By.CSS_SELECTOR,
+                    f'[name="u_login"], [data-col-id="{STATE_COLUMN_ID}"]',
+                )
+            )
+        )
+    except TimeoutException:
+        logging.warning(f"Unexpected BPM page at {driver.current_url}")
+        return False
+    return element.get_attribute("name") != "u_login"
+
+
+def save_cookies(driver: Chrome, cookies_path: str) -> None:
+    with open(cookies_path, "w", encoding="utf-8") as f:
+        json.dump(driver.get_cookies(), f, indent=4, ensure_ascii=False)
+
+
+def restore_cookies(driver: Chrome, cookies_path: str) -> bool:
+    if not os.path.exists(cookies_path):
+        return False
+
+    with open(cookies_path, "r", encoding="utf-8") as f:
+        cookies = json.load(f)
+
+    now = time.time()
+    cdp_cookies = []
+    for cookie in cookies:
+        expiry = cookie.get("expiry")
+        if expiry is not None and expiry < now:
+            continue
+        cdp_cookie = {
+            "name": cookie["name"],
+            "value": cookie["value"],
+            "domain": cookie["domain"],
+            "path": cookie.get("path", "/"),
+            "secure": cookie.get("secure", False),
+            "httpOnly": cookie.get("httpOnly", False),
+        }
+        if expiry is not None:
+            cdp_cookie["expires"] = expiry
+        if cookie.get("sameSite"):
+            cdp_cookie["sameSite"] = cookie["sameSite"]
+        cdp_cookies.append(cdp_cookie)
+
+    if not cdp_cookies:
+        return False
+
+    driver.execute_cdp_cmd("Network.setCookies", {"cookies": cdp_cookies})
+    return True
+
+
+def open_session(
+    driver: Chrome,
+    wait: WebDriverWait,
+    bpm_user: str,
+    bpm_password: str,
+    base_url: str = BPM_URL,
+    cookies_path: Optional[str] = None,
+) -> None:
+    if cookies_path and restore_cookies(driver, cookies_path):
+        driver.get(f"{base_url}/?s=obj_a&gid=873&reset_page=1")
+        if is_logged_in(driver=driver, wait=wait):
+            logging.info("Reused BPM session")
+            return
+
+    login(
+        driver=driver,
+        wait=wait,
+        bpm_user=bpm_user,
+        bpm_password=bpm_password,
+        base_url=base_url,
+    )
+    wait.until(
+        ec.presence_of_element_located(
+            (By.CSS_SELECTOR, f'[data-col-id="{STATE_COLUMN_ID}"]')
+        )
+    )
+
+    if cookies_path:
+        save_cookies(driver, cookies_path)
+
+
+def group_table_rows(
+    headers: List[str], cells: List[str]
+) -> List[Dict[str, str]]:
+    rows = []
+    for i in range(0, len(cells), len(headers)):
+        row = dict(zip(headers, cells[i : i + len(headers)]))
+        if not row.get("Наименование расхода") and not row.get(
+            "Наименование, №, дата подтверждающего документа"
+        ):
+            continue
+        rows.append(row)
+    return rows
+
+
 def parse_table(driver: Chrome) -> List[Dict[str, str]]:
     table = driver.find_element(
         By.CSS_SELECTOR, ".udf_box_content.udf_box_content_84661 .obj_table"
@@ -63,43 +496,21 @@ def parse_table(driver: Chrome) -> List[Dict[str, str]]:
         )
     ]
 
-    rows = []
-    for i in range(0, len(cells), len(headers)):
-        row = dict(zip(headers, cells[i : i + len(headers)]))
-        if not row.get("Наименование расхода") and not row.get(
-            "Наименование, №, дата подтверждающего документа"
-        ):
-            continue
-        rows.append(row)
-    return rows
+    return group_table_rows(headers, cells)
 
 
 def fill_reimbursement(
-    driver: Chrome, request: data.Request
+    read_field: FieldReader, request: data.Request
 ) -> Optional[data.Reimbursement]:
     oz_num = float(request.oz.replace(" ", ""))
 
     if oz_num <= 0:
         return None
 
-    city = driver.find_element(
-        By.CSS_SELECTOR,
-        '[data-field-label="Место командирования/обучения"] [class="field_view"]',
-    ).text
-
-    start_date = driver.find_element(
-        By.CSS_SELECTOR, '[data-field-label="Дата начала"] [class="field_view"]'
-    ).text
-
-    end_date = driver.find_element(
-        By.CSS_SELECTOR,
-        '[data-field-label="Дата окончания"] [class="field_view"]',
-    ).text
-
-    order_date = driver.find_element(
-        By.CSS_SELECTOR,
-        '[data-field-label="Дата подписания"] [class="field_view"]',
-    ).text
+    city = read_field("Место командирования/обучения", "field_view", None)
+    start_date = read_field("Дата начала", "field_view", None)
+    end_date = read_field("Дата окончания", "field_view", None)
+    order_date = read_field("Дата подписания", "field_view", None)
 
     reimbursement = data.Reimbursement(
         city=city,
@@ -128,140 +539,184 @@ def find_element(
         return default
 
 
+def driver_field_reader(driver: Chrome) -> FieldReader:
+    def read_field(
+        label: str, class_name: str, default: Optional[str] = None
+    ) -> str:
+        return find_element(
+            driver,
+            By.CSS_SELECTOR,
+            f'[data-field-label="{label}"] [class="{class_name}"]',
+            default=default,
+        )
+
+    return read_field
+
+
+def build_request(
+    read_field: FieldReader, table_rows: List[Dict[str, str]]
+) -> data.Request:
+    order_id = read_field("№ Приказа", "field_view", None)
+
+    rk = read_field("За пределами РК", "udf_field_el_value", None) == "—"
+
+    ob = read_field(
+        "Оплачено Банком и/или с корпоративной карты",
+        "udf_field_el_value",
+        "0.00",
+    )
+
+    advance = read_field(
+        "Получено по заявке на денежный аванс",
+        "udf_field_el_value",
+        "0.00",
+    )
+    ppz = advance != "0.00"
+
+    oz = read_field(
+        "Остаток задолженности (+)/Перерасход (-)",
+        "udf_field_el_value",
+        "0.00",
+    )
+
+    order_type = read_field("Вид заявки", "udf_field_el_value", None)
+
+    request = data.Request(
+        order_id=order_id,
+        rk=rk,
+        ob=ob,
+        ppz=ppz,
+        oz=oz,
+        order_type=order_type,
+        reimbursement=None,
+        rows=[],
+        advance=advance,
+    )
+
+    request.reimbursement = fill_reimbursement(
+        read_field=read_field, request=request
+    )
+
+    for row in table_rows:
+        request_row = data.Row(
+            name=row["Наименование расхода"],
+            name_num_date=row[
+                "Наименование, №, дата подтверждающего документа"
+            ],
+            sum_tenge=row["Сумма расходов в тенге"],
+            currency=row["Валюта"],
+            debt_type="2",
+        )
+        request.rows.append(request_row)
+
+    return request
+
+
+def parse_request_page(driver: Chrome, wait: WebDriverWait) -> data.Request:
+    wait.until(
+        ec.presence_of_element_located((By.CSS_SELECTOR, "div.form_table"))
+    )
+    return build_request(
+        read_field=driver_field_reader(driver),
+        table_rows=parse_table(driver=driver),
+    )
+
+
+def parse_snapshot(page_source: str) -> data.Request:
+    page = snapshot.SnapshotPage(page_source)
+    headers, cells = page.read_table()
+    return build_request(
+        read_field=page.read_field,
+        table_rows=group_table_rows(headers, cells),
+    )
+
+
+def reparse_snapshot(snapshot_folder: str, digest: str) -> Optional[JSON]:
+    try:
+        request = parse_snapshot(snapshot.load(snapshot_folder, digest))
+    except (LookupError, KeyError, ValueError) as error:
+        logging.error(f"Failed to re-parse snapshot {digest}: {error}")
+        return None
+    batch.RowBatch.from_requests([request]).assign_debt_types()
+    return dataclasses.asdict(request)
+
+
+def reparse(
+    snapshot_folder: str, output_json_path: str, workers: Optional[int] = None
+) -> List[data.Request]:
+    digests = snapshot.latest_digests(snapshot_folder)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        json_requests = list(
+            pool.map(
+                functools.partial(reparse_snapshot, snapshot_folder),
+                digests,
+                chunksize=max(1, len(digests) // ((workers or 4) * 4)),
+            )
+        )
+    json_requests = [request for request in json_requests if request]
+
+    with open(output_json_path, "w", encoding="utf-8") as f:
+        json.dump(json_requests, f, indent=4, ensure_ascii=False)
+
+    logging.info(f"Re-parsed {len(json_requests)}/{len(digests)} snapshots")
+    return data.load_json_requests(output_json_path)
+
+
 def run(
     executable_path: str,
     bpm_user: str,
     bpm_password: str,
     sample_json_path: str,
+    base_url: str = BPM_URL,
+    profile: str = "default",
+    user_data_dir: Optional[str] = None,
+    cookies_path: Optional[str] = None,
+    snapshot_folder: Optional[str] = None,
+    only_urls: Optional[Set[str]] = None,
 ) -> List[data.Request]:
-    driver = driver_init(executable_path)
+    start = time.perf_counter()
+    driver = driver_init(
+        executable_path, profile=profile, user_data_dir=user_data_dir
+    )
 
     requests: List[data.Request] = []
 
     wait = WebDriverWait(driver, timeout=10)
 
     with driver:
-        login(
+        open_session(
             driver=driver,
             wait=wait,
             bpm_user=bpm_user,
             bpm_password=bpm_password,
+            base_url=base_url,
+            cookies_path=cookies_path,
         )
-
-        state_filter_input = wait.until(
-            ec.presence_of_element_located(
-                (By.CSS_SELECTOR, '[data-col-id="4680"]')
-            )
+        logging.info(
+            f"BPM startup-to-first-page: {time.perf_counter() - start:.2f}s"
         )
-        state_filter_input.send_keys("На исполнении (НУ ДБУ)")
 
-        time.sleep(3)
-
-        urls = [
-            url.get_attribute("href")
-            for url in driver.find_elements(
-                By.CSS_SELECTOR,
-                ".js_dbl_click_text_select.js_list_dflt_col_5 > a",
-            )
-        ]
-
-        for url in urls:
-            if not url:
+        for entry in iter_list_entries(
+            driver=driver, wait=wait, base_url=base_url
+        ):
+            if only_urls is not None and entry.url not in only_urls:
                 continue
 
-            driver.get(url)
-
-            wait.until(
-                ec.presence_of_element_located(
-                    (By.CSS_SELECTOR, "div.form_table")
-                )
-            )
-
-            order_id = find_element(
-                driver,
-                By.CSS_SELECTOR,
-                '[data-field-label="№ Приказа"] [class="field_view"]',
-            )
-
-            rk = (
-                find_element(
-                    driver,
-                    By.CSS_SELECTOR,
-                    '[data-field-label="За пределами РК"] [class="udf_field_el_value"]',
-                )
-                == "—"
-            )
-
-            ob = find_element(
-                driver,
-                By.CSS_SELECTOR,
-                '[data-field-label="Оплачено Банком и/или с корпоративной карты"] [class="udf_field_el_value"]',
-                default="0.00",
-            )
-
-            ppz = (
-                find_element(
-                    driver,
-                    By.CSS_SELECTOR,
-                    '[data-field-label="Получено по заявке на денежный аванс"] [class="udf_field_el_value"]',
-                    default="0.00",
-                )
-                != "0.00"
-            )
-
-            oz = find_element(
-                driver,
-                By.CSS_SELECTOR,
-                '[data-field-label="Остаток задолженности (+)/Перерасход (-)"] [class="udf_field_el_value"]',
-                default="0.00",
-            )
-
-            order_type = find_element(
-                driver,
-                By.CSS_SELECTOR,
-                '[data-field-label="Вид заявки"] [class="udf_field_el_value"]',
-            )
-
-            request = data.Request(
-                order_id=order_id,
-                rk=rk,
-                ob=ob,
-                ppz=ppz,
-                oz=oz,
-                order_type=order_type,
-                reimbursement=None,
-                rows=[],
-            )
-
-            request.reimbursement = fill_reimbursement(
-                driver=driver, request=request
-            )
-
-            rows = parse_table(driver=driver)
-            for row in rows:
-                request_row = data.Row(
-                    name=row["Наименование расхода"],
-                    name_num_date=row[
-                        "Наименование, №, дата подтверждающего документа"
-                    ],
-                    sum_tenge=row["Сумма расходов в тенге"],
-                    currency=row["Валюта"],
-                    debt_type="2",
+            with metrics.BPM_PAGE_SECONDS.time(page="detail"):
+                retry.call(
+                    "bpm",
+                    driver.get,
+                    entry.url,
+                    retry_on=(WebDriverException,),
                 )
-
-                name = request_row.name.lower()
-                if "проезд" in name or "сервисный" in name:
-                    request_row.debt_type = "10"
-                elif not request.ppz and (
-                    "суточные" in name or "проживание" in name
-                ):
-                    request_row.debt_type = "39"
-                else:
-                    request_row.debt_type = "2"
-
-                request.rows.append(request_row)
+                request = parse_request_page(driver=driver, wait=wait)
+            if snapshot_folder:
+                snapshot.store(snapshot_folder, driver.page_source, entry.url)
             requests.append(request)
 
+    batch.RowBatch.from_requests(requests).assign_debt_types()
+    metrics.ORDERS.inc(len(requests), outcome="scraped")
+
     with open(sample_json_path, "w", encoding="utf-8") as f:
         json.dump(
             [dataclasses.asdict(request) for request in requests],
@@ -271,3 +726,83 @@ def run(
         )
 
     return requests
+
+
+def benchmark(
+    executable_path: str,
+    urls: List[str],
+    profiles: List[str],
+    runs: int = 3,
+    user_data_dir: Optional[str] = None,
+) -> Dict[str, List[float]]:
+    results: Dict[str, List[float]] = {}
+    for profile in profiles:
+        driver = driver_init(
+            executable_path,
+            profile=profile,
+            user_data_dir=user_data_dir if profile == "fast" else None,
+        )
+        wait = WebDriverWait(driver, timeout=30)
+        latencies = []
+        with driver:
+            for _ in range(runs):
+                for url in urls:
+                    start = time.perf_counter()
+                    driver.get(url)
+                    parse_request_page(driver=driver, wait=wait)
+                    latencies.append(time.perf_counter() - start)
+        results[profile] = latencies
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="BPM scraping tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="compare page-to-data latency of driver profiles"
+    )
+    benchmark_parser.add_argument("--driver", required=True)
+    benchmark_parser.add_argument("--url", action="append", required=True)
+    benchmark_parser.add_argument("--runs", type=int, default=3)
+    benchmark_parser.add_argument("--user-data-dir")
+    benchmark_parser.add_argument(
+        "--profile", action="append", choices=["default", "fast"]
+    )
+
+    reparse_parser = subparsers.add_parser(
+        "reparse", help="rebuild requests from stored page snapshots"
+    )
+    reparse_parser.add_argument("--snapshots", required=True)
+    reparse_parser.add_argument("--output", required=True)
+    reparse_parser.add_argument("--workers", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "reparse":
+        requests = reparse(
+            snapshot_folder=args.snapshots,
+            output_json_path=args.output,
+            workers=args.workers,
+        )
+        print(f"{len(requests)} requests written to {args.output}")
+        return
+
+    results = benchmark(
+        executable_path=args.driver,
+        urls=args.url,
+        profiles=args.profile or ["default", "fast"],
+        runs=args.runs,
+        user_data_dir=args.user_data_dir,
+    )
+    for profile, latencies in results.items():
+        print(
+            f"{profile}: n={len(latencies)} "
+            f"median={statistics.median(latencies) * 1000:.0f}ms "
+            f"min={min(latencies) * 1000:.0f}ms "
+            f"max={max(latencies) * 1000:.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import argparse
+import dataclasses
+import html
+import http.cookies
+import http.server
+import logging
+import random
+import secrets
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import src.bpm as bpm
+
+SESSION_COOKIE = "PHPSESSID"
+OTHER_STATES = ["Черновик", "На согласовании", "Исполнена"]
+ORDER_TYPES = ["Командировка", "Обучение"]
+CITIES = ["Астана", "Алматы", "Шымкент", "Актобе", "Караганда", "Москва"]
+EXPENSES = [
+    "Суточные",
+    "Проезд",
+    "Проживание",
+    "Проживание с НДС",
+    "Сервисный сбор",
+    "Штраф за отмену",
+    "Проживание сверх норм",
+    "Прочие расходы",
+]
+HEADERS = [
+    "Наименование расхода",
+    "Наименование, №, дата подтверждающего документа",
+    "Сумма расходов в тенге",
+    "Валюта",
+]
+CENT = Decimal("0.01")
+
+
+@dataclasses.dataclass
+class Order:
+    id: int
+    order_id: str
+    state: str
+    rk: bool
+    order_type: str
+    city: str
+    start_date: date
+    end_date: date
+    order_date: date
+    rows: List[Tuple[str, str, Decimal, str]]
+    ob: Decimal
+    advance: Optional[Decimal]
+    oz: Decimal
+
+
+def format_amount(amount: Decimal) -> str:
+    return f"{amount:,.2f}".replace(",", " ")
+
+
+def order_state(seed: int, id: int, state_share: float = 0.8) -> str:
+    rng = random.Random(f"{seed}/{id}/state")
+    if rng.random() < state_share:
+        return bpm.STATE
+    return rng.choice(OTHER_STATES)
+
+
+def generate_order(seed: int, id: int, state_share: float = 0.8) -> Order:
+    rng = random.Random(f"{seed}/{id}")
+
+    start_date = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    end_date = start_date + timedelta(days=rng.randint(1, 14))
+
+    rows = []
+    for i in range(rng.randint(1, 6)):
+        name = rng.choice(EXPENSES)
+        amount = Decimal(rng.randint(1_000_00, 500_000_00)) / 100
+        rows.append(
+            (
+                name,
+                f"Чек №{rng.randint(1, 99999)} от {end_date:%d.%m.%Y}",
+                amount,
+                "KZT",
+            )
+        )
+    total = sum((row[2] for row in rows), Decimal("0.00"))
+
+    ob = (total * Decimal(rng.choice([0, 0, 0.25, 0.5]))).quantize(CENT)
+    advance = (
+        (total * Decimal(rng.uniform(0.5, 1.5))).quantize(CENT)
+        if rng.random() < 0.5
+        else None
+    )
+    oz = (advance or Decimal("0.00")) + ob - total
+
+    return Order(
+        id=id,
+        order_id=f"{id} - I" if rng.random() < 0.1 else f"{id}-I",
+        state=order_state(seed, id, state_share),
+        rk=rng.random() < 0.7,
+        order_type=rng.choice(ORDER_TYPES),
+        city=rng.choice(CITIES),
+        start_date=start_date,
+        end_date=end_date,
+        order_date=start_date - timedelta(days=rng.randint(1, 10)),
+        rows=rows,
+        ob=ob,
+        advance=advance,
+        oz=oz,
+    )
+
+
+def field_view(label: str, value: str) -> str:
+    return (
+        f'<div class="form_field" data-field-label="{html.escape(label)}">'
+        f'<div class="field_label">{html.escape(label)}</div>'
+        f'<div class="field_view">{html.escape(value)}</div></div>'
+    )
+
+
+def udf_field(label: str, value: str) -> str:
+    return (
+        f'<div class="udf_field" data-field-label="{html.escape(label)}">'
+        f'<div class="udf_field_el_label">{html.escape(label)}</div>'
+        f'<div class="udf_field_el_value">{html.escape(value)}</div></div>'
+    )
+
+
+def render_login(next_url: str, error: bool = False) -> str:
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        "<title>BPM</title></head><body>"
+        + ("<p class='error'>Неверный логин или пароль</p>" if error else "")
+        + "<form method='post' action='/login'>"
+        f"<input type='hidden' name='next' value='{html.escape(next_url)}'>"
+        "<input type='text' name='u_login'>"
+        "<input type='password' name='pwd'>"
+        "<button type='submit' name='submit'>Войти</button>"
+        "</form></body></html>"
+    )
+
+
+FILTER_SCRIPT = """
+<script>
+var timer = null;
+document.querySelector('[data-col-id="{column_id}"]').addEventListener(
+  'input', function (event) {{
+    clearTimeout(timer);
+    timer = setTimeout(function () {{
+      var params = new URLSearchParams(location.search);
+      params.set('{filter_param}', event.target.value);
+      params.set('{page_param}', '1');
+      location.search = params.toString();
+    }}, 300);
+  }}
+);
+</script>
+"""
+
+
+def render_list(orders: List[Order], state: str) -> str:
+    rows = "".join(
+        "<tr>"
+        f"<td class='js_list_dflt_col_1'>{order.id}</td>"
+        "<td class='js_dbl_click_text_select js_list_dflt_col_5'>"
+        f"<a href='/?s=obj_a&amp;gid=873&amp;id={order.id}'>"
+        f"Авансовый отчет {html.escape(order.order_id)}</a></td>"
+        f"<td class='js_list_dflt_col_7'>{html.escape(order.state)}</td>"
+        "</tr>"
+        for order in orders
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        "<title>Список</title></head><body>"
+        "<table class='list_table'><tr class='list_header'>"
+        "<th>ID</th><th>Наименование</th><th>"
+        f"<input type='text' data-col-id='{bpm.STATE_COLUMN_ID}' "
+        f"value='{html.escape(state)}'></th></tr>"
+        f"{rows}</table>"
+        + FILTER_SCRIPT.format(
+            column_id=bpm.STATE_COLUMN_ID,
+            filter_param=bpm.FILTER_PARAM.format(column_id=bpm.STATE_COLUMN_ID),
+            page_param=bpm.PAGE_PARAM,
+        )
+        + "</body></html>"
+    )
+
+
+def render_detail(order: Order) -> str:
+    fields = [
+        field_view("№ Приказа", order.order_id),
+        udf_field("За пределами РК", "—" if order.rk else "Да"),
+        udf_field(
+            "Оплачено Банком и/или с корпоративной карты",
+            format_amount(order.ob),
+        ),
+        udf_field(
+            "Остаток задолженности (+)/Перерасход (-)", format_amount(order.oz)
+        ),
+        udf_field("Вид заявки", order.order_type),
+        field_view("Место командирования/обучения", order.city),
+        field_view("Дата начала", f"{order.start_date:%d.%m.%Y}"),
+        field_view("Дата окончания", f"{order.end_date:%d.%m.%Y}"),
+        field_view("Дата подписания", f"{order.order_date:%d.%m.%Y}"),
+    ]
+    if order.advance is not None:
+        fields.insert(
+            3,
+            udf_field(
+                "Получено по заявке на денежный аванс",
+                format_amount(order.advance),
+            ),
+        )
+
+    header = "".join(f"<th><div>{html.escape(h)}</div></th>" for h in HEADERS)
+    cells = "".join(
+        f"<tr data-row='{i}'>"
+        + "".join(
+            f"<td><div class='obj_table_value'>{html.escape(value)}</div></td>"
+            for value in (name, document, format_amount(amount), currency)
+        )
+        + "</tr>"
+        for i, (name, document, amount, currency) in enumerate(order.rows)
+    )
+    table = (
+        "<div class='udf_box_content udf_box_content_84661'>"
+        "<table class='obj_table'>"
+        f"<tr class='obj_tbl_header js_hidden'>{header}</tr>"
+        f"<tr class='obj_tbl_header'>{header}</tr>"
+        f"{cells}</table></div>"
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{html.escape(order.order_id)}</title></head><body>"
+        f"<div class='form_table'>{''.join(fields)}</div>"
+        f"{table}</body></html>"
+    )
+
+
+@dataclasses.dataclass
+class ServerConfig:
+    orders: int = 100
+    page_size: int = 20
+    seed: int = 0
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    state_share: float = 0.8
+    user: str = "user"
+    password: str = "password"
+
+
+class BpmHandler(http.server.BaseHTTPRequestHandler):
+    config = ServerConfig()
+    index: Dict[str, List[int]] = {}
+    sessions: Dict[str, float] = {}
+    lock = threading.Lock()
+    rng = random.Random(0)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(format % args)
+
+    def send_html(
+        self, body: str, status: int = 200, headers: Optional[dict] = None
+    ) -> None:
+        content = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def inject(self) -> bool:
+        with self.lock:
+            delay = self.config.latency + self.rng.uniform(
+                -self.config.jitter, self.config.jitter
+            )
+            failed = self.rng.random() < self.config.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            self.send_html("<h1>Service Unavailable</h1>", status=503)
+        return failed
+
+    def has_session(self) -> bool:
+        cookies = http.cookies.SimpleCookie(self.headers.get("Cookie", ""))
+        morsel = cookies.get(SESSION_COOKIE)
+        return morsel is not None and morsel.value in self.sessions
+
+    def do_GET(self) -> None:
+        if self.inject():
+            return
+
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if url.path != "/":
+            self.send_html("<h1>Not Found</h1>", status=404)
+            return
+        if not self.has_session():
+            self.send_html(render_login(self.path))
+            return
+
+        if "id" in params:
+            id = int(params["id"]) if params["id"].isdigit() else 0
+            if not 1 <= id <= self.config.orders:
+                self.send_html("<h1>Not Found</h1>", status=404)
+                return
+            self.send_html(
+                render_detail(
+                    generate_order(
+                        self.config.seed, id, self.config.state_share
+                    )
+                )
+            )
+            return
+
+        state = params.get(
+            bpm.FILTER_PARAM.format(column_id=bpm.STATE_COLUMN_ID), ""
+        )
+        page = params.get(bpm.PAGE_PARAM, "1")
+        page = int(page) if page.isdigit() and int(page) > 0 else 1
+        self.send_html(render_list(self.list_page(state, page), state))
+
+    def list_page(self, state: str, page: int) -> List[Order]:
+        ids = (
+            self.index.get(state, [])
+            if state
+            else range(1, self.config.orders + 1)
+        )
+        start = (page - 1) * self.config.page_size
+        return [
+            generate_order(self.config.seed, id, self.config.state_share)
+            for id in ids[start : start + self.config.page_size]
+        ]
+
+    def do_POST(self) -> None:
+        if self.inject():
+            return
+
+        length = int(self.headers.get("Content-Length", "0"))
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+        next_url = form.get("next") or "/?s=obj_a&gid=873"
+        if urllib.parse.urlsplit(self.path).path != "/login":
+            self.send_html("<h1>Not Found</h1>", status=404)
+            return
+        if (form.get("u_login"), form.get("pwd")) != (
+            self.config.user,
+            self.config.password,
+        ):
+            self.send_html(render_login(next_url, error=True), status=401)
+            return
+
+        session_id = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[session_id] = time.time()
+        self.send_html(
+            "",
+            status=303,
+            headers={
+                "Location": next_url,
+                "Set-Cookie": f"{SESSION_COOKIE}={session_id}; Path=/",
+            },
+        )
+
+
+def serve(
+    config: ServerConfig, port: int = 8080, host: str = "127.0.0.1"
+) -> http.server.ThreadingHTTPServer:
+    index: Dict[str, List[int]] = {}
+    for id in range(1, config.orders + 1):
+        index.setdefault(
+            order_state(config.seed, id, config.state_share), []
+        ).append(id)
+
+    handler = type(
+        "Handler",
+        (BpmHandler,),
+        {
+            "config": config,
+            "index": index,
+            "sessions": {},
+            "lock": threading.Lock(),
+            "rng": random.Random(config.seed),
+        },
+    )
+    return http.server.ThreadingHTTPServer((host, port), handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local BPM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--state-share", type=float, default=0.8)
+    parser.add_argument("--user", default="user")
+    parser.add_argument("--password", default="password")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    config = ServerConfig(
+        orders=args.orders,
+        page_size=args.page_size,
+        seed=args.seed,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        state_share=args.state_share,
+        user=args.user,
+        password=args.password,
+    )
+    server = serve(config, port=args.port, host=args.host)
+    logging.info(
+        f"Fake BPM on http://{args.host}:{args.port}/, "
+        f"set BPM_URL to scrape it"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,131 @@
+import collections
+import dataclasses
+import itertools
+import logging
 import re
+import threading
 import time
 from time import sleep
-from typing import Union
+from typing import Dict, List, Optional, Sequence, Set, Union
 
+import pyperclip
 import pywinauto
 import pywinauto.base_wrapper
 import pywinauto.findwindows
 import win32com.client as win32
 import win32con
 import win32gui
-from pywinauto import Application, mouse, win32functions
+from pywinauto import mouse, win32functions
 
-import process_utils
+import src.metrics as metrics
+import src.process_utils as process_utils
+import src.references as references
+import src.retry as retry
+import src.wiggle as wiggle
 
 CDispatch = Union[win32.CDispatch, win32.dynamic.CDispatch]
 
+TEXT_METHODS = ("set_text", "paste", "type")
+KEYBOARD_METHODS = ("paste", "type")
+PASTE_MIN_LENGTH = 10
+SPECIAL_KEYS_PATTERN = re.compile(r"([+^%~(){}\[\]])")
+
+session_aborted = threading.Event()
+
+
+class SessionAborted(Exception):
+    pass
+
+
+def check_session() -> None:
+    if session_aborted.is_set():
+        raise SessionAborted("Colvir session was aborted by the watchdog")
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    resolve_seconds: float = 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        if not self.misses:
+            return 0.0
+        return self.hits * self.resolve_seconds / self.misses
+
+    def reset(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.resolve_seconds = 0.0
+
+
+control_stats = CacheStats()
+
+
+class ControlCache:
+    def __init__(
+        self,
+        win: pywinauto.WindowSpecification,
+        stats: Optional[CacheStats] = None,
+    ) -> None:
+        self.win = win
+        self.stats = stats or control_stats
+        self.handle: Optional[int] = None
+        self.controls: Dict[str, pywinauto.base_wrapper.BaseWrapper] = {}
+
+    def invalidate(self) -> None:
+        if self.controls:
+            self.stats.invalidations += 1
+        self.handle = None
+        self.controls.clear()
+
+    def __getitem__(self, name: str) -> pywinauto.base_wrapper.BaseWrapper:
+        check_session()
+        if self.handle is None or not win32gui.IsWindow(self.handle):
+            self.invalidate()
+
+        control = self.controls.get(name)
+        if control is not None and win32gui.IsWindow(control.handle):
+            self.stats.hits += 1
+            return control
+
+        start = time.perf_counter()
+        wrapper = self.win.wrapper_object()
+        if self.handle is not None and wrapper.handle != self.handle:
+            self.invalidate()
+        self.handle = wrapper.handle
+        control = self.win[name].wrapper_object()
+        self.stats.resolve_seconds += time.perf_counter() - start
+        self.stats.misses += 1
+
+        self.controls[name] = control
+        return control
+
+
+class LookupCache:
+    def __init__(self, mirror: Optional[references.References] = None) -> None:
+        self.mirror = mirror
+        self.values: Dict[str, Dict[str, str]] = collections.defaultdict(dict)
+        self.disabled: Set[str] = set()
+        self.skipped: collections.Counter = collections.Counter()
+        self.opened: collections.Counter = collections.Counter()
+
+    def get(self, dialog: str, key: str) -> Optional[str]:
+        if dialog in self.disabled:
+            return None
+        return self.values[dialog].get(key)
+
+    def remember(self, dialog: str, key: str, value: str) -> None:
+        if value.strip():
+            self.values[dialog][key] = value.strip()
+
+    def disable(self, dialog: str) -> None:
+        self.disabled.add(dialog)
+        self.values.pop(dialog, None)
+
 
 class Colvir:
     def __init__(self, process_path: str, user: str, password: str):
@@ -24,20 +135,23 @@ class Colvir:
         self.app = self.open_colvir()
 
     def open_colvir(self) -> pywinauto.Application:
-        app = None
-        for _ in range(10):
-            try:
-                app = pywinauto.Application().start(cmd_line=self.process_path)
-                self.login(app=app, user=self.user, password=self.password)
-                self.check_interactivity(app=app)
-                break
-            except pywinauto.findwindows.ElementNotFoundError:
-                if isinstance(app, Application) and self.change_password(app):
-                    break
-                process_utils.kill_all_processes("COLVIR")
-                continue
-
-        assert app is not None, Exception("max_retries exceeded")
+        return retry.call(
+            "colvir_start",
+            self.start_session,
+            retry_on=(pywinauto.findwindows.ElementNotFoundError,),
+            on_retry=lambda _: process_utils.kill_all_processes("COLVIR"),
+        )
+
+    def start_session(self) -> pywinauto.Application:
+        app = pywinauto.Application().start(cmd_line=self.process_path)
+        process_utils.registry.register(app.process)
+        try:
+            self.login(app=app, user=self.user, password=self.password)
+            self.check_interactivity(app=app)
+        except pywinauto.findwindows.ElementNotFoundError as error:
+            if self.change_password(app):
+                return app
+            raise error
         return app
 
     @staticmethod
@@ -95,6 +209,14 @@ class Colvir:
         assert self.app is not None
         return self.app
 
+    def restart(self) -> pywinauto.Application:
+        metrics.COLVIR_RESTARTS.inc()
+        process_utils.kill_all_processes("COLVIR")
+        session_aborted.clear()
+        retry.reset("colvir_focus", "colvir_keys")
+        self.app = self.open_colvir()
+        return self.app
+
 
 def set_focus_win32(win: pywinauto.WindowSpecification) -> None:
     if win.wrapper_object().has_focus():
@@ -115,23 +237,20 @@ def set_focus_win32(win: pywinauto.WindowSpecification) -> None:
     win32functions.WaitGuiThreadIdle(handle)
 
 
-def set_focus(win: pywinauto.WindowSpecification, retries: int = 20) -> None:
-    while retries > 0:
-        try:
-            if retries % 2 == 0:
-                set_focus_win32(win)
-            else:
-                win.set_focus()
-            break
-        except (Exception, BaseException):
-            retries -= 1
-            time.sleep(5)
-            continue
+def set_focus(win: pywinauto.WindowSpecification) -> None:
+    attempts = itertools.count()
+
+    def focus() -> None:
+        check_session()
+        if next(attempts) % 2 == 0:
+            set_focus_win32(win)
+        else:
+            win.set_focus()
 
-    if retries <= 0:
-        raise Exception("Failed to set focus")
+    retry.call("colvir_focus", focus, give_up=(SessionAborted,))
 
 
+@wiggle.holds_ui
 def press(
     win: pywinauto.WindowSpecification, key: str, pause: float = 0
 ) -> None:
@@ -166,6 +285,7 @@ def get_window(
     regex: bool = False,
     found_index: int = 0,
 ) -> pywinauto.WindowSpecification:
+    check_session()
     window = (
         app.window(title=title, found_index=found_index)
         if not regex
@@ -176,6 +296,7 @@ def get_window(
     return window
 
 
+@wiggle.holds_ui
 def type_keys(
     window: pywinauto.WindowSpecification,
     keystrokes: str,
@@ -184,16 +305,20 @@ def type_keys(
 ) -> None:
     set_focus(window)
     for command in list(filter(None, re.split(r"({.+?})", keystrokes))):
-        try:
-            window.type_keys(command, set_foreground=False)
-        except pywinauto.base_wrapper.ElementNotEnabled:
-            time.sleep(1)
-            window.type_keys(command, set_foreground=False)
+        check_session()
+        retry.call(
+            "colvir_keys",
+            window.type_keys,
+            command,
+            set_foreground=False,
+            retry_on=(pywinauto.base_wrapper.ElementNotEnabled,),
+        )
         time.sleep(step_delay)
 
     time.sleep(delay_after)
 
 
+@wiggle.holds_ui
 def find_and_click_button(
     app: pywinauto.Application,
     window: pywinauto.WindowSpecification,
@@ -202,7 +327,9 @@ def find_and_click_button(
     horizontal: bool = True,
     offset: int = 5,
 ) -> None:
-    status_win = app.window(title_re="Банковская система.+")
+    status_bar = ControlCache(app.window(title_re="Банковская система.+"))[
+        "StatusBar"
+    ]
     rectangle = toolbar.rectangle()
     mid_point = rectangle.mid_point()
     window.move_mouse_input(coords=(mid_point.x, mid_point.y), absolute=True)
@@ -218,9 +345,10 @@ def find_and_click_button(
 
     i = 0
     while (
-        status_win["StatusBar"].window_text().strip() != target_button_name
+        status_bar.window_text().strip() != target_button_name
         or point >= end_point
     ):
+        check_session()
         point = start_point + i * 5
 
         if horizontal:
@@ -236,3 +364,136 @@ def find_and_click_button(
     window.click_input(
         button="left", coords=(x + x_offset, y + y_offset), absolute=True
     )
+
+
+def escape_keys(text: str) -> str:
+    return SPECIAL_KEYS_PATTERN.sub(r"{\1}", text)
+
+
+def normalize_text(text: str) -> str:
+    return text.replace("\r\n", "\n").strip()
+
+
+def select_all(control: pywinauto.base_wrapper.BaseWrapper) -> None:
+    win32gui.SendMessage(control.handle, win32con.EM_SETSEL, 0, -1)
+
+
+def focus_control(control: pywinauto.base_wrapper.BaseWrapper) -> None:
+    control.set_focus()
+    if not control.has_focus():
+        control.click_input()
+    win32functions.WaitGuiThreadIdle(control.handle)
+
+
+@wiggle.holds_ui
+def paste_text(control: pywinauto.base_wrapper.BaseWrapper, text: str) -> None:
+    previous = pyperclip.paste()
+    try:
+        pyperclip.copy(text)
+        focus_control(control)
+        select_all(control)
+        control.type_keys("^v", set_foreground=False)
+        win32functions.WaitGuiThreadIdle(control.handle)
+    finally:
+        pyperclip.copy(previous)
+
+
+@wiggle.holds_ui
+def apply_text(
+    control: pywinauto.base_wrapper.BaseWrapper,
+    text: str,
+    method: str,
+    pause: float = 0.05,
+) -> None:
+    check_session()
+    if method == "set_text":
+        control.set_text(text)
+    elif method == "paste":
+        paste_text(control, text)
+    elif method == "overwrite":
+        control.click_input()
+        control.type_keys(
+            "{LEFT}" * len(text) + escape_keys(text),
+            with_spaces=True,
+            pause=pause,
+            set_foreground=False,
+        )
+    else:
+        focus_control(control)
+        select_all(control)
+        control.type_keys("{DEL}", set_foreground=False)
+        control.type_keys(
+            escape_keys(text),
+            with_spaces=True,
+            with_newlines=True,
+            pause=pause,
+            set_foreground=False,
+        )
+
+
+@wiggle.holds_ui
+def enter_text(
+    control: pywinauto.base_wrapper.BaseWrapper,
+    text: str,
+    methods: Sequence[str] = TEXT_METHODS,
+    pause: float = 0.05,
+) -> str:
+    if len(text) < PASTE_MIN_LENGTH:
+        methods = [method for method in methods if method != "paste"]
+
+    for method in methods:
+        try:
+            apply_text(control, text, method, pause=pause)
+        except AttributeError:
+            continue
+        except pywinauto.base_wrapper.ElementNotEnabled:
+            time.sleep(1)
+            continue
+
+        if normalize_text(control.window_text()) == normalize_text(text):
+            return method
+        logging.warning(f"{method} was not accepted by {control.class_name()}")
+
+    raise Exception(f"Failed to enter text into {control.class_name()}")
+
+
+def focused_control(
+    window: pywinauto.WindowSpecification,
+) -> pywinauto.base_wrapper.BaseWrapper:
+    return window.wrapper_object().get_focus()
+
+
+def enter_cell_text(window: pywinauto.WindowSpecification, text: str) -> str:
+    set_focus(window)
+    return enter_text(focused_control(window), text, methods=KEYBOARD_METHODS)
+
+
+def parse_clipboard_rows(text: str) -> List[Dict[str, str]]:
+    lines = [line.replace("\r", "") for line in text.split("\n")]
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return []
+    header = lines[0].split("\t")
+    return [dict(zip(header, line.split("\t"))) for line in lines[1:]]
+
+
+@wiggle.holds_ui
+def read_grid(
+    window: pywinauto.WindowSpecification, count: int
+) -> List[Dict[str, str]]:
+    set_focus(window)
+    window.type_keys("^{HOME}^+{END}^c", set_foreground=False)
+    time.sleep(0.5)
+    rows = parse_clipboard_rows(pyperclip.paste())
+    if len(rows) >= count:
+        return rows
+
+    window.type_keys("^{HOME}", set_foreground=False)
+    rows = []
+    for _ in range(count):
+        check_session()
+        window.type_keys("^c", set_foreground=False)
+        time.sleep(0.2)
+        rows.extend(parse_clipboard_rows(pyperclip.paste())[-1:])
+        window.type_keys("{DOWN}", set_foreground=False)
+    return rows
@@ -0,0 +1,291 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import traceback
+import warnings
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import dotenv
+import pandas as pd
+import psutil
+
+import bpm
+import main as robot
+
+try:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import src.data as data
+    import src.metrics as metrics
+    import src.retry as retry
+    import src.status_cache as status_cache
+    from src.logger import rotate_file_handler, setup_logger
+    from src.mail import send_mail
+    from src.notification import TelegramAPI, send_message
+except Exception as exc:
+    exception_traceback = traceback.format_exc()
+    raise exc
+
+LOCK_NAME = "daemon.lock"
+STATE_NAME = "daemon_state.json"
+FAILED_OUTCOMES = (
+    "Нет. Ошибка",
+    "Нет. Colvir завис",
+    "Нет. Обработка прервана",
+)
+
+
+class AlreadyRunning(Exception):
+    pass
+
+
+class InstanceLock:
+    def __init__(self, lock_path: str) -> None:
+        self.lock_path = lock_path
+
+    def __enter__(self) -> "InstanceLock":
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            with open(self.lock_path, "r", encoding="utf-8") as f:
+                pid = f.read().strip()
+            if pid.isdigit() and psutil.pid_exists(int(pid)):
+                raise AlreadyRunning(f"Daemon is already running, {pid=}")
+            logging.warning(f"Removing stale lock of {pid=}")
+            os.remove(self.lock_path)
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(str(os.getpid()))
+        return self
+
+    def __exit__(self, *args) -> None:
+        if os.path.exists(self.lock_path):
+            os.remove(self.lock_path)
+
+
+@dataclasses.dataclass
+class DaemonState:
+    entries: Dict[str, str] = dataclasses.field(default_factory=dict)
+    requests: Dict[str, str] = dataclasses.field(default_factory=dict)
+    first_seen: Dict[str, str] = dataclasses.field(default_factory=dict)
+    day_report: List[Dict[str, str]] = dataclasses.field(default_factory=list)
+    latencies: List[float] = dataclasses.field(default_factory=list)
+    summary_sent: str = ""
+
+    @classmethod
+    def load(cls, state_json_path: str) -> "DaemonState":
+        if not os.path.exists(state_json_path):
+            return cls()
+        with open(state_json_path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, state_json_path: str) -> None:
+        temp_path = f"{state_json_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(dataclasses.asdict(self), f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, state_json_path)
+
+
+def entry_hash(entry: bpm.ListEntry) -> str:
+    return hashlib.sha256(f"{entry.url}\n{entry.text}".encode()).hexdigest()
+
+
+def request_hash(request: data.Request) -> str:
+    return hashlib.sha256(
+        json.dumps(
+            dataclasses.asdict(request), sort_keys=True, ensure_ascii=False
+        ).encode()
+    ).hexdigest()
+
+
+def changed_urls(
+    state: DaemonState, entries: List[bpm.ListEntry]
+) -> Dict[str, str]:
+    return {
+        entry.url: entry_hash(entry)
+        for entry in entries
+        if state.entries.get(entry.url) != entry_hash(entry)
+    }
+
+
+def cycle(settings: robot.Settings, state: DaemonState) -> None:
+    entries = bpm.poll_list(
+        cookies_path=settings.cookies_path,
+        base_url=os.getenv("BPM_URL", bpm.BPM_URL),
+    )
+    if entries is None:
+        changed: Optional[Dict[str, str]] = None
+        logging.info("Polling without a session, scraping the full list")
+    else:
+        changed = changed_urls(state, entries)
+        if not changed:
+            return
+        logging.info(f"{len(changed)} new or changed BPM requests")
+
+    now = datetime.now()
+    with metrics.STAGE_SECONDS.time(stage="scrape"):
+        requests = robot.run_bpm_stage(
+            settings, only_urls=set(changed) if changed is not None else None
+        )
+
+    fresh: List[data.Request] = []
+    hashes: Dict[str, str] = {}
+    for request in requests:
+        if request is None:
+            continue
+        order_id = data.normalize_order_id(request.order_id)
+        hashes[order_id] = request_hash(request)
+        if state.requests.get(order_id) == hashes[order_id]:
+            continue
+        state.first_seen.setdefault(order_id, now.isoformat(timespec="seconds"))
+        fresh.append(request)
+
+    if not fresh:
+        logging.info("No new or changed requests after parsing")
+        report_data = []
+    else:
+        with metrics.STAGE_SECONDS.time(stage="post"):
+            report_data = robot.run_colvir_stage(
+                settings=settings, requests=fresh, now=now
+            )
+
+    failed: Set[str] = set()
+    for order_report in report_data:
+        order_id = data.normalize_order_id(order_report["№ Приказа"])
+        if order_report["Отработан роботом"].startswith(FAILED_OUTCOMES):
+            failed.add(order_id)
+        elif order_id in hashes:
+            state.requests[order_id] = hashes[order_id]
+    record_latencies(settings, state, report_data)
+
+    if changed is not None and not failed:
+        state.entries.update(changed)
+
+    state.day_report.extend(report_data)
+
+
+def record_latencies(
+    settings: robot.Settings,
+    state: DaemonState,
+    report_data: List[Dict[str, str]],
+) -> None:
+    posted = [
+        order_report
+        for order_report in report_data
+        if order_report["Отработан роботом"] == "Да"
+    ]
+    if not posted:
+        return
+
+    cache = status_cache.StatusCache(
+        db_path=os.path.join(settings.data_folder, "status_cache.sqlite3"),
+        reverify_after=timedelta(0),
+    )
+    for order_report in posted:
+        order_id = data.normalize_order_id(order_report["№ Приказа"])
+        entry = cache.get(order_id)
+        first_seen = state.first_seen.pop(order_id, None)
+        if entry is None or first_seen is None:
+            continue
+        latency = (
+            entry.checked_at - datetime.fromisoformat(first_seen)
+        ).total_seconds()
+        state.latencies.append(latency)
+        logging.info(f"{order_id}: BPM to Colvir in {latency / 60:.1f} min")
+    cache.close()
+
+
+def latency_summary(latencies: List[float]) -> str:
+    if not latencies:
+        return "Нет проведенных приказов"
+    return (
+        f"Проведено: {len(latencies)}, "
+        f"медиана {statistics.median(latencies) / 60:.1f} мин, "
+        f"максимум {max(latencies) / 60:.1f} мин"
+    )
+
+
+def send_daily_summary(
+    settings: robot.Settings, state: DaemonState, now: datetime
+) -> None:
+    summary_hour = int(os.getenv("DAEMON_SUMMARY_HOUR", "18"))
+    today = now.date().isoformat()
+    if now.hour < summary_hour or state.summary_sent == today:
+        return
+
+    pd.DataFrame(state.day_report).to_excel(settings.report_path, index=False)
+    if not send_mail(
+        subject='Отчет "Учет командировочных"',
+        body=(
+            'Отчет "Учет командировочных"<br>'
+            "Время от появления заявки в BPM до проведения в Colvir: "
+            f"{latency_summary(state.latencies)}"
+        ),
+        attachment_folder_path=settings.attachment_folder_path,
+    ):
+        raise Exception("Failed to send the daily summary mail")
+    logging.info(f"Daily summary sent: {latency_summary(state.latencies)}")
+
+    state.day_report = []
+    state.latencies = []
+    state.summary_sent = today
+
+
+def rotate_logs(project_folder: str, log_day: date) -> date:
+    if log_day == date.today():
+        return log_day
+    rotate_file_handler(project_folder=project_folder)
+    return date.today()
+
+
+def run(bot: TelegramAPI) -> None:
+    warnings.simplefilter(action="ignore", category=UserWarning)
+    dotenv.load_dotenv()
+
+    project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    setup_logger(project_folder=project_folder)
+    retry.configure(json.loads(os.getenv("RETRY_POLICIES", "{}")))
+    log_day = date.today()
+
+    settings = robot.Settings.from_env(project_folder)
+    poll_seconds = float(os.getenv("DAEMON_POLL_SECONDS", "300"))
+    state_json_path = os.path.join(settings.data_folder, STATE_NAME)
+    metrics.serve_from_env()
+
+    with InstanceLock(os.path.join(settings.data_folder, LOCK_NAME)):
+        logging.info(f"Daemon started, polling every {poll_seconds:.0f}s")
+        state = DaemonState.load(state_json_path)
+        while True:
+            try:
+                log_day = rotate_logs(project_folder, log_day)
+                cycle(settings=settings, state=state)
+                send_daily_summary(
+                    settings=settings, state=state, now=datetime.now()
+                )
+            except KeyboardInterrupt:
+                break
+            except Exception as error:
+                logging.exception(error)
+                send_message(bot, traceback.format_exc())
+            finally:
+                state.save(state_json_path)
+                metrics.LAST_RUN.set(time.time())
+                metrics.publish()
+
+            try:
+                time.sleep(poll_seconds)
+            except KeyboardInterrupt:
+                break
+
+    logging.info("Daemon stopped")
+
+
+if __name__ == "__main__":
+    telegram_bot = TelegramAPI()
+    run(bot=telegram_bot)
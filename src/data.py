@@ -57,6 +57,11 @@ class Request:
     order_type: str
     reimbursement: Optional[Reimbursement]
     rows: List[Row]
+    advance: str = "0.00"
+
+
+def normalize_order_id(order_id: str) -> str:
+    return re.sub(r"\s+", "", order_id).upper()
 
 
 def is_num(num_str: str) -> bool:
@@ -104,6 +109,12 @@ def parse_request(json_request: JSON_Request) -> Optional[Request]:
         logging.error(f"Error. ppz mismatch: {ppz}")
         return None
 
+    # NOTE: Получено по заявке на денежный аванс (сумма, нет в старых выгрузках)
+    advance = json_request.get("advance", "0.00")
+    if not isinstance(advance, str) or not is_num(advance):
+        logging.error(f"Error. advance mismatch: {advance}")
+        return None
+
     # NOTE: Остаток задолженности (+)/Перерасход (-)
     oz = json_request.get("oz")
     if oz is None or not isinstance(oz, str) or not is_num(oz):
@@ -125,6 +136,7 @@ def parse_request(json_request: JSON_Request) -> Optional[Request]:
         order_type=order_type,
         reimbursement=None,
         rows=[],
+        advance=advance,
     )
 
     json_reimbursement = json_request.get("reimbursement")
@@ -0,0 +1,131 @@
+import collections
+import dataclasses
+import logging
+from typing import Callable, Dict, List, Sequence
+
+import pywinauto.base_wrapper
+from pywinauto import win32functions
+
+import src.colvir_utils as colvir_utils
+import src.wiggle as wiggle
+
+MAX_ATTEMPTS = 3
+
+
+class FormError(Exception):
+    pass
+
+
+def equals(actual: str, expected: str) -> bool:
+    return colvir_utils.normalize_text(actual) == colvir_utils.normalize_text(
+        expected
+    )
+
+
+def contains(actual: str, expected: str) -> bool:
+    return colvir_utils.normalize_text(expected) in actual
+
+
+@dataclasses.dataclass
+class Field:
+    control: str
+    value: str
+    methods: Sequence[str] = colvir_utils.TEXT_METHODS
+    commit: bool = False
+    verify: Callable[[str, str], bool] = equals
+
+    def usable_methods(self) -> List[str]:
+        if len(self.value) < colvir_utils.PASTE_MIN_LENGTH:
+            return [method for method in self.methods if method != "paste"]
+        return list(self.methods)
+
+
+@dataclasses.dataclass
+class Form:
+    name: str
+    fields: List[Field]
+
+
+learned: Dict[str, int] = {}
+retried: collections.Counter = collections.Counter()
+
+
+def read_values(
+    controls: colvir_utils.ControlCache, fields: Sequence[Field]
+) -> Dict[str, str]:
+    return {
+        field.control: controls[field.control].window_text() for field in fields
+    }
+
+
+def enter_field(
+    controls: colvir_utils.ControlCache, field: Field, method: str
+) -> None:
+    try:
+        colvir_utils.apply_text(controls[field.control], field.value, method)
+    except (AttributeError, pywinauto.base_wrapper.ElementNotEnabled) as error:
+        logging.warning(f"{field.control}: {method} failed ({error!r})")
+
+
+def commit_fields(
+    controls: colvir_utils.ControlCache, fields: Sequence[Field]
+) -> None:
+    commit = [field for field in fields if field.commit]
+    if not commit:
+        return
+
+    for field in commit + commit[:1]:
+        control = controls[field.control]
+        control.set_focus()
+        win32functions.WaitGuiThreadIdle(control.handle)
+
+
+@wiggle.holds_ui
+def fill_form(
+    controls: colvir_utils.ControlCache,
+    form: Form,
+    attempts: int = MAX_ATTEMPTS,
+) -> None:
+    methods = {field.control: field.usable_methods() for field in form.fields}
+    index = {
+        field.control: min(
+            learned.get(f"{form.name}/{field.control}", 0),
+            len(methods[field.control]) - 1,
+        )
+        for field in form.fields
+    }
+
+    pending = list(form.fields)
+    for attempt in range(1, attempts + 1):
+        for field in pending:
+            enter_field(
+                controls, field, methods[field.control][index[field.control]]
+            )
+        commit_fields(controls, form.fields)
+
+        values = read_values(controls, form.fields)
+        pending = [
+            field
+            for field in form.fields
+            if not field.verify(values[field.control], field.value)
+        ]
+        if not pending:
+            for field in form.fields:
+                learned[f"{form.name}/{field.control}"] = index[field.control]
+            return
+
+        retried[form.name] += len(pending)
+        logging.warning(
+            f"{form.name}: attempt {attempt}/{attempts}, not accepted "
+            + str({field.control: values[field.control] for field in pending})
+        )
+        controls.invalidate()
+        for field in pending:
+            index[field.control] = min(
+                index[field.control] + 1, len(methods[field.control]) - 1
+            )
+
+    raise FormError(
+        f"{form.name}: fields not accepted "
+        f"{[field.control for field in pending]}"
+    )
@@ -0,0 +1,208 @@
+import argparse
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import sys
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+import src.data as data
+
+RUN_PATTERN = re.compile(r"run_id='([^']+)'")
+ORDER_PATTERN = re.compile(r"Processing order_id='([^']+)'")
+LOG_NAME_PATTERN = re.compile(r"^(\d{2})\.(\d{2})\.(\d{2})\.log$")
+
+ARCHIVE_SUFFIX = ".z"
+INDEX_NAME = "index.sqlite3"
+
+Segment = Tuple[Optional[str], Optional[str], bytes]
+
+
+def connect_index(logs_folder: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(os.path.join(logs_folder, INDEX_NAME))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS segments ("
+        "archive TEXT NOT NULL, "
+        "offset INTEGER NOT NULL, "
+        "length INTEGER NOT NULL, "
+        "day TEXT NOT NULL, "
+        "run_id TEXT, "
+        "order_id TEXT)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS segments_order_id ON segments (order_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS segments_run_id ON segments (run_id)"
+    )
+    return conn
+
+
+def log_day(file_name: str) -> Optional[datetime.date]:
+    match = LOG_NAME_PATTERN.match(file_name)
+    if not match:
+        return None
+    day, month, year = (int(group) for group in match.groups())
+    return datetime.date(2000 + year, month, day)
+
+
+def iter_closed_logs(
+    logs_folder: str, today: datetime.date
+) -> Iterator[Tuple[str, datetime.date]]:
+    for folder, _, file_names in os.walk(logs_folder):
+        for file_name in sorted(file_names):
+            day = log_day(file_name)
+            if day is None or day >= today:
+                continue
+            yield os.path.join(folder, file_name), day
+
+
+def split_segments(content: bytes) -> List[Segment]:
+    segments: List[Segment] = []
+    run_id: Optional[str] = None
+    order_id: Optional[str] = None
+    lines: List[bytes] = []
+
+    def flush() -> None:
+        if lines:
+            segments.append((run_id, order_id, b"".join(lines)))
+            lines.clear()
+
+    for line in content.splitlines(keepends=True):
+        text = line.decode("utf-8", errors="replace")
+
+        run_match = RUN_PATTERN.search(text)
+        if run_match and run_match.group(1) != run_id:
+            flush()
+            run_id = run_match.group(1)
+            order_id = None
+
+        order_match = ORDER_PATTERN.search(text)
+        if order_match:
+            new_order_id = data.normalize_order_id(order_match.group(1))
+            if new_order_id != order_id:
+                flush()
+                order_id = new_order_id
+
+        lines.append(line)
+
+    flush()
+    return segments
+
+
+def archive_log(
+    conn: sqlite3.Connection,
+    logs_folder: str,
+    log_path: str,
+    day: datetime.date,
+) -> str:
+    with open(log_path, "rb") as f:
+        content = f.read()
+
+    archive_path = log_path + ARCHIVE_SUFFIX
+    archive_name = os.path.relpath(archive_path, logs_folder)
+    rows = []
+    with open(archive_path, "wb") as f:
+        for run_id, order_id, chunk in split_segments(content):
+            compressed = zlib.compress(chunk, level=9)
+            rows.append(
+                (
+                    archive_name,
+                    f.tell(),
+                    len(compressed),
+                    day.isoformat(),
+                    run_id,
+                    order_id,
+                )
+            )
+            f.write(compressed)
+
+    with conn:
+        conn.execute("DELETE FROM segments WHERE archive = ?", (archive_name,))
+        conn.executemany("INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    os.remove(log_path)
+    return archive_path
+
+
+def archive_logs(
+    logs_folder: str, today: Optional[datetime.date] = None
+) -> List[str]:
+    today = today or datetime.date.today()
+    archived = []
+    conn = connect_index(logs_folder)
+    try:
+        for log_path, day in list(iter_closed_logs(logs_folder, today)):
+            archived.append(archive_log(conn, logs_folder, log_path, day))
+            logging.info(f"Archived {log_path}")
+    finally:
+        conn.close()
+    return archived
+
+
+def query(
+    logs_folder: str,
+    order_id: Optional[str] = None,
+    run_id: Optional[str] = None,
+) -> Iterator[str]:
+    conditions = []
+    params = []
+    if order_id:
+        conditions.append("order_id = ?")
+        params.append(data.normalize_order_id(order_id))
+    if run_id:
+        conditions.append("run_id = ?")
+        params.append(run_id)
+    if not conditions:
+        raise ValueError("order_id or run_id is required")
+
+    conn = connect_index(logs_folder)
+    try:
+        segments = conn.execute(
+            "SELECT archive, offset, length FROM segments "
+            f"WHERE {' AND '.join(conditions)} ORDER BY day, rowid",
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+
+    for archive, offset, length in segments:
+        with open(os.path.join(logs_folder, archive), "rb") as f:
+            f.seek(offset)
+            chunk = zlib.decompress(f.read(length))
+        yield chunk.decode("utf-8", errors="replace")
+
+
+def main() -> None:
+    project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Log archive and index")
+    parser.add_argument(
+        "--logs",
+        default=os.path.join(project_folder, "logs"),
+        help="logs folder",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("archive", help="compress and index closed day logs")
+
+    query_parser = subparsers.add_parser(
+        "query", help="print indexed log slices"
+    )
+    query_parser.add_argument("--order", help="№ Приказа, e.g. '410 - I'")
+    query_parser.add_argument("--run", help="run id")
+
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        for archive_path in archive_logs(args.logs):
+            print(archive_path)
+    else:
+        for chunk in query(args.logs, order_id=args.order, run_id=args.run):
+            sys.stdout.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
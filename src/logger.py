@@ -17,26 +17,16 @@ class PywinautoLoggerFilter(logging.Filter):
         return False
 
 
-def setup_logger(project_folder: str) -> None:
-    root_folder = os.path.join(project_folder, "logs")
-    os.makedirs(root_folder, exist_ok=True)
+FORMATTER = logging.Formatter(
+    "%(asctime).19s %(levelname)s %(name)s %(filename)s %(funcName)s : %(message)s"
+)
 
-    pywinauto.actionlogger.enable()
-    pywinauto.actionlogger.ActionLogger.logger.propagate = True
-    pywinauto.actionlogger.ActionLogger.logger.removeHandler(
-        pywinauto.actionlogger.ActionLogger.logger.handlers[0]
-    )
-    pywinauto.actionlogger.ActionLogger.logger.addFilter(LogFilter())
-
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-
-    formatter = logging.Formatter(
-        "%(asctime).19s %(levelname)s %(name)s %(filename)s %(funcName)s : %(message)s"
-    )
 
+def daily_file_handler(project_folder: str) -> logging.FileHandler:
     today = datetime.date.today()
-    year_month_folder = os.path.join(root_folder, today.strftime("%Y/%B"))
+    year_month_folder = os.path.join(
+        project_folder, "logs", today.strftime("%Y/%B")
+    )
     os.makedirs(year_month_folder, exist_ok=True)
 
     file_handler = logging.FileHandler(
@@ -44,11 +34,47 @@ def setup_logger(project_folder: str) -> None:
         encoding="utf-8",
     )
     file_handler.setLevel(logging.DEBUG)
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(FORMATTER)
+    return file_handler
+
+
+def rotate_file_handler(project_folder: str) -> None:
+    logger = logging.getLogger()
+    file_handler = daily_file_handler(project_folder)
+    for handler in list(logger.handlers):
+        if (
+            isinstance(handler, logging.FileHandler)
+            and handler.formatter is FORMATTER
+        ):
+            logger.removeHandler(handler)
+            handler.close()
+    logger.addHandler(file_handler)
+
+
+def setup_logger(project_folder: str) -> None:
+    root_folder = os.path.join(project_folder, "logs")
+    os.makedirs(root_folder, exist_ok=True)
+
+    action_logger = pywinauto.actionlogger.ActionLogger.logger
+    pywinauto.actionlogger.enable()
+    action_logger.propagate = True
+    for handler in list(action_logger.handlers):
+        action_logger.removeHandler(handler)
+    if not any(isinstance(f, LogFilter) for f in action_logger.filters):
+        action_logger.addFilter(LogFilter())
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    for handler in list(logger.handlers):
+        if handler.formatter is FORMATTER:
+            logger.removeHandler(handler)
+            handler.close()
+
+    file_handler = daily_file_handler(project_folder)
 
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(logging.DEBUG)
-    stream_handler.setFormatter(formatter)
+    stream_handler.setFormatter(FORMATTER)
 
     httpcore_logger = logging.getLogger("httpcore")
     httpcore_logger.setLevel(logging.INFO)
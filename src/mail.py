@@ -6,6 +6,13 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from typing import List
 
+import src.retry as retry
+
+PERMANENT_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPAuthenticationError,
+)
+
 
 def get_from_env(key: str) -> str:
     value = os.getenv(key)
@@ -39,17 +46,26 @@ def send_mail(
         part.add_header("Content-Disposition", "attachment", filename=file_name)
         msg.attach(part)
 
-    try:
+    def deliver() -> dict:
         with smtplib.SMTP(server, 25) as smtp:
-            response = smtp.sendmail(sender, recipients_lst, msg.as_string())
-            if response:
-                print("Failed to send email to the following recipients:")
-                for recipient, error in response.items():
-                    print(f"{recipient}: {error}")
-                return False
-            else:
-                print("Email sent successfully.")
-                return True
-    except smtplib.SMTPException as e:
+            return smtp.sendmail(sender, recipients_lst, msg.as_string())
+
+    try:
+        response = retry.call(
+            "smtp",
+            deliver,
+            retry_on=(smtplib.SMTPException, OSError),
+            give_up=PERMANENT_ERRORS,
+        )
+    except (retry.RetryError, *PERMANENT_ERRORS) as e:
         print(f"Failed to send email: {e}")
         return False
+
+    if response:
+        print("Failed to send email to the following recipients:")
+        for recipient, error in response.items():
+            print(f"{recipient}: {error}")
+        return False
+    else:
+        print("Email sent successfully.")
+        return True
@@ -1,13 +1,15 @@
+import dataclasses
+import json
 import logging
 import os
 import sys
 import time
 import traceback
 import warnings
-from datetime import datetime
-from functools import wraps
+from datetime import datetime, timedelta
+from functools import partial, wraps
 from time import sleep
-from typing import Any, Callable, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set
 
 import dotenv
 import pandas as pd
@@ -18,17 +20,58 @@ import bpm
 
 try:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import src.batch as batch
     import src.colvir_utils as colvir_utils
     import src.data as data
+    import src.forms as forms
+    import src.metrics as metrics
+    import src.order_queue as order_queue
+    import src.planner as planner
     import src.process_utils as process_utils
+    import src.reconcile as reconcile
+    import src.references as references
+    import src.retry as retry
+    import src.status_cache as status_cache
+    import src.watchdog as watchdog
+    import src.wiggle as wiggle
     from src.logger import setup_logger
     from src.mail import send_mail
     from src.notification import TelegramAPI, send_message
-    from src.wiggle import wiggle_mouse
 except Exception as exc:
     exception_traceback = traceback.format_exc()
     raise exc
 
+ORDER_TITLES = [
+    "Произошла ошибка.*",
+    "Подтверждение",
+    "Утвердить авансовый отчет",
+    "Авансовый отчет .+",
+    "Изменение/добавление позиции",
+    "Оплата КОМАНДИРОВОК.+",
+    "Журнал операций",
+    "Распоряжение на командировку.+",
+    "Список счетов к оплате",
+]
+HARVESTED_DIALOGS = [
+    "Валюты",
+    "Ставки НДС",
+    "Подразделения",
+    "Виды дебиторской",
+]
+LOOKUP_TITLES = [
+    "Найти.*",
+    "Результаты поиска",
+    "Поиск",
+    "Фильтр",
+    "Справочник.+",
+    "Бюджетная классификация.+",
+    "Классификатор",
+    "Валюты",
+    "Ставки НДС",
+    "Подразделения",
+    "Виды дебиторской.+",
+]
+
 
 def handle_error(func: Callable[..., Any]) -> Callable[..., Any]:
     @wraps(func)
@@ -54,63 +97,24 @@ def fill_filter_win(
     app: pywinauto.Application, year: str, order_id: str
 ) -> None:
     filter_win = colvir_utils.get_window(app=app, title="Фильтр")
-
-    start_date = f"01.01.{year}"
-    end_date = f"31.12.{year}"
-
-    filter_win["Edit8"].set_text(start_date)
-    assert filter_win["Edit8"].window_text() == start_date
-
-    filter_win["Edit10"].set_text(end_date)
-    assert filter_win["Edit10"].window_text() == end_date
-
-    filter_win["Edit6"].set_text(order_id)
-    assert filter_win["Edit6"].window_text() == order_id
-
-    filter_win["OK"].click()
+    filter_controls = colvir_utils.ControlCache(filter_win)
+
+    forms.fill_form(
+        filter_controls,
+        forms.Form(
+            name="Фильтр",
+            fields=[
+                forms.Field("Edit8", f"01.01.{year}"),
+                forms.Field("Edit10", f"31.12.{year}"),
+                forms.Field("Edit6", order_id),
+            ],
+        ),
+    )
+    filter_controls["OK"].click()
 
     sleep(1)
 
 
-def get_kbk(text: str, rk: bool) -> Tuple[str, str]:
-    text = text.lower()
-    if rk is False:
-        budget_type = "EXC"
-        if "суточные" in text:
-            kbk = "80302020201"
-        elif "проезд" in text:
-            kbk = "80302020202"
-        elif "проживание" in text:
-            kbk = "80302020203"
-        elif "штраф" in text:
-            kbk = "80213"
-        elif "отмена" in text:
-            kbk = "803030903"
-        elif "сверх норм" in text:
-            kbk = "80302020301"
-        else:
-            kbk = "70302020204"
-            budget_type = "CPC"
-    else:
-        budget_type = "CPC"
-        if "суточные" in text:
-            kbk = "70302020101"
-        elif "проезд" in text:
-            kbk = "70302020102"
-        elif "проживание" in text:
-            kbk = "70302020103"
-        elif "штраф" in text:
-            kbk = "80213"
-            budget_type = "EXC"
-        elif "отмена" in text:
-            kbk = "803030903"
-            budget_type = "EXC"
-        else:
-            kbk = "70302020104"
-
-    return kbk, budget_type
-
-
 def new_finance(
     app: pywinauto.Application,
     journal_win: pywinauto.WindowSpecification,
@@ -126,71 +130,299 @@ def new_finance(
 
     finance_win = colvir_utils.get_window(app=app, title="Финансовая запись")
     finance_win.set_focus()
-
-    finance_win["Edit46"].click_input()
-    finance_win["Edit46"].type_keys("{BACKSPACE}" * 8)
-    sleep(0.5)
-    finance_win["Edit46"].type_keys("28000504")
-    sleep(0.5)
-    finance_win["Edit42"].click_input()
-    finance_win["Edit42"].type_keys("{BACKSPACE}")
-    finance_win["Edit42"].type_keys("1")
-    sleep(0.5)
-    finance_win["Edit16"].click_input()
-    finance_win["Edit16"].type_keys("{BACKSPACE}" * 20)
-    sleep(0.5)
-    finance_win["Edit16"].type_keys("KZ54907A185400000035")
-    sleep(0.5)
-    finance_win["Edit14"].click_input()
-    finance_win["Edit14"].type_keys("{LEFT}" * len(request.oz))
-    finance_win["Edit14"].type_keys(request.oz)
-    sleep(0.5)
-    finance_win["Edit32"].click_input()
-    finance_win["Edit32"].type_keys("{BACKSPACE}" * 20)
-    sleep(0.5)
-    finance_win["Edit32"].type_keys("KZ45907A185400000003")
-    sleep(1)
-    finance_win["Edit30"].click_input()
-    sleep(1)
-    finance_win["Edit14"].click_input()
-    sleep(1)
-    finance_win["Edit30"].click_input()
-    sleep(1)
-    finance_win["TDBMemo"].type_keys(
-        "{BACKSPACE}" * len(str(request.reimbursement)),
-    )
-    finance_win["TDBMemo"].type_keys(
-        str(request.reimbursement), with_spaces=True, pause=0.05
-    )
-
-    for class_name in [
-        "Edit46",
-        "Edit42",
-        "Edit16",
-        "Edit14",
-        "Edit32",
-        "Edit30",
-        "Edit14",
-        "TDBMemo",
-    ]:
-        finance_win[class_name].click_input()
-        sleep(1)
+    finance_controls = colvir_utils.ControlCache(finance_win)
+
+    forms.fill_form(
+        finance_controls,
+        forms.Form(
+            name="Финансовая запись",
+            fields=[
+                forms.Field("Edit46", "28000504", commit=True),
+                forms.Field("Edit42", "1", commit=True),
+                forms.Field("Edit16", "KZ54907A185400000035", commit=True),
+                forms.Field(
+                    "Edit14",
+                    request.oz,
+                    methods=("overwrite",),
+                    commit=True,
+                    verify=forms.contains,
+                ),
+                forms.Field("Edit32", "KZ45907A185400000003", commit=True),
+                forms.Field(
+                    "TDBMemo",
+                    str(request.reimbursement),
+                    methods=colvir_utils.KEYBOARD_METHODS,
+                    commit=True,
+                ),
+            ],
+        ),
+    )
 
     colvir_utils.find_and_click_button(
         app=app,
         window=finance_win,
-        toolbar=finance_win["Static3"],
+        toolbar=finance_controls["Static3"],
         target_button_name="Сохранить изменения (PgDn)",
     )
 
 
+def select_currency(app: pywinauto.Application, currency: str) -> None:
+    currency_win = colvir_utils.get_window(
+        app=app, title="Валюты", wait_for="exists enabled"
+    )
+    colvir_utils.type_keys(window=currency_win, keystrokes="Z", step_delay=0.5)
+    find_win = colvir_utils.get_window(
+        app=app, title="Найти ", wait_for="exists enabled"
+    )
+    find_win["Edit2"].set_text(currency)
+    find_win["OK"].click()
+    currency_win["OK"].click()
+
+
+def select_nds(app: pywinauto.Application, nds_code: str) -> None:
+    nds_win = colvir_utils.get_window(
+        app=app, title="Ставки НДС", wait_for="exists enabled"
+    )
+    colvir_utils.type_keys(window=nds_win, keystrokes="Z", step_delay=0.5)
+    find_win = colvir_utils.get_window(
+        app=app, title="Найти код", wait_for="exists enabled"
+    )
+    find_win["Edit2"].set_text(nds_code)
+    find_win["OK"].click()
+    nds_win["OK"].click()
+
+
+def select_kbk(app: pywinauto.Application, kbk: str, budget_type: str) -> None:
+    kbk_win = colvir_utils.get_window(
+        app=app, title="Классификатор", wait_for="exists"
+    )
+    colvir_utils.type_keys(window=kbk_win, keystrokes="{F9}")
+
+    dictionary_win = colvir_utils.get_window(
+        app=app, title="Справочник.+", regex=True
+    )
+    dictionary_controls = colvir_utils.ControlCache(dictionary_win)
+
+    dictionary_controls["Edit2"].set_text(budget_type)
+    assert dictionary_controls["Edit2"].window_text() == budget_type
+
+    dictionary_controls["Edit4"].set_text(kbk)
+    assert dictionary_controls["Edit4"].window_text() == kbk
+
+    dictionary_controls["OK"].click()
+
+    result_win = colvir_utils.get_window(
+        app=app, title="Бюджетная классификация.+", regex=True
+    )
+    result_win["OK"].click()
+
+
+def select_branch(app: pywinauto.Application, branch: str) -> None:
+    branches_win = colvir_utils.get_window(app=app, title="Подразделения")
+    colvir_utils.type_keys(window=branches_win, keystrokes="{F7}")
+    find_win = colvir_utils.get_window(app=app, title="Поиск")
+    find_win["Edit2"].set_text(branch)
+    find_win["OK"].click()
+    result_win = colvir_utils.get_window(app=app, title="Результаты поиска")
+    result_win["Перейти"].click()
+    branches_win["OK"].click()
+
+
+def select_debt_type(app: pywinauto.Application, debt_type: str) -> None:
+    debt_win = colvir_utils.get_window(
+        app=app, title="Виды дебиторской.+", regex=True
+    )
+    colvir_utils.type_keys(window=debt_win, keystrokes="{F9}")
+    filter_win = colvir_utils.get_window(app=app, title="Фильтр")
+    filter_win["Edit8"].set_text(debt_type)
+    sleep(1)
+    filter_win["OK"].click_input()
+
+    debt_win.wait(wait_for="active enabled")
+    debt_win["OK"].click_input()
+
+
+def harvest(
+    app: pywinauto.Application, mirror: references.References, dialog: str
+) -> None:
+    name = references.DICTIONARIES[dialog]
+    try:
+        window = colvir_utils.get_window(
+            app=app, title=f"{dialog}.*", wait_for="exists enabled", regex=True
+        )
+        grid_rows = colvir_utils.read_grid(window=window, count=1)
+        colvir_utils.type_keys(window=window, keystrokes="^{HOME}")
+    except colvir_utils.SessionAborted as error:
+        raise error
+    except Exception as error:
+        logging.warning(f"Failed to refresh {name} from Colvir: {error}")
+        return
+
+    if len(grid_rows) > 1 and mirror.refresh(
+        name, references.extract_codes(grid_rows), "colvir"
+    ):
+        logging.info(
+            f"Refreshed {name}: {len(mirror.dictionaries[name].codes)}"
+        )
+
+
+def lookup(
+    app: pywinauto.Application,
+    change_win: pywinauto.WindowSpecification,
+    lookups: Optional[colvir_utils.LookupCache],
+    dialog: str,
+    key: str,
+    select: Callable[[], None],
+) -> None:
+    resolved = lookups.get(dialog, key) if lookups else None
+    if resolved is not None:
+        try:
+            colvir_utils.enter_cell_text(change_win, resolved)
+            lookups.skipped[dialog] += 1
+            return
+        except colvir_utils.SessionAborted as error:
+            raise error
+        except Exception as error:
+            logging.warning(f"Direct entry into {dialog} failed: {error}")
+            lookups.disable(dialog)
+
+    change_win.type_keys("^{ENTER}")
+    if (
+        lookups
+        and lookups.mirror
+        and dialog in HARVESTED_DIALOGS
+        and lookups.mirror.is_stale(references.DICTIONARIES[dialog])
+    ):
+        harvest(app=app, mirror=lookups.mirror, dialog=dialog)
+    select()
+    if lookups:
+        lookups.opened[dialog] += 1
+        editor = colvir_utils.focused_control(change_win)
+        if "Edit" in editor.class_name():
+            lookups.remember(dialog, key, editor.window_text())
+
+
+def enter_position(
+    app: pywinauto.Application,
+    change_win: pywinauto.WindowSpecification,
+    change_controls: colvir_utils.ControlCache,
+    row: data.Row,
+    kbk: str,
+    budget_type: str,
+    with_nds: bool,
+    hotkeys: bool = True,
+    lookups: Optional[colvir_utils.LookupCache] = None,
+) -> None:
+    if hotkeys:
+        colvir_utils.type_keys(window=change_win, keystrokes="{INS}")
+    else:
+        colvir_utils.find_and_click_button(
+            app,
+            change_win,
+            change_controls["Static4"],
+            "Создать новую запись (Ins)",
+        )
+
+    colvir_utils.type_keys(
+        window=change_win, keystrokes="{ENTER}{SPACE}{ENTER}{RIGHT}"
+    )
+    colvir_utils.enter_cell_text(change_win, row.name)
+    colvir_utils.type_keys(
+        window=change_win,
+        keystrokes=(
+            "{ENTER}{RIGHT}"
+            f"{row.sum_tenge.replace(' ', '')}"
+            "{ENTER}{RIGHT}1{ENTER}{RIGHT 2}"
+        ),
+    )
+
+    time.sleep(1)
+    colvir_utils.type_keys(window=change_win, keystrokes="{ENTER}")
+    time.sleep(1)
+    lookup(
+        app,
+        change_win,
+        lookups,
+        "Валюты",
+        row.currency,
+        partial(select_currency, app, row.currency),
+    )
+
+    if with_nds:
+        colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT 2}{ENTER}")
+        lookup(
+            app,
+            change_win,
+            lookups,
+            "Ставки НДС",
+            references.NDS_CODE,
+            partial(select_nds, app, references.NDS_CODE),
+        )
+
+        colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT 3}{ENTER}")
+    else:
+        colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT 5}{ENTER}")
+
+    lookup(
+        app,
+        change_win,
+        lookups,
+        "Классификатор",
+        f"{budget_type}/{kbk}",
+        partial(select_kbk, app, kbk, budget_type),
+    )
+
+    colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT}{ENTER}")
+    lookup(
+        app,
+        change_win,
+        lookups,
+        "Подразделения",
+        references.BRANCH,
+        partial(select_branch, app, references.BRANCH),
+    )
+
+    colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT}{ENTER}")
+    lookup(
+        app,
+        change_win,
+        lookups,
+        "Виды дебиторской",
+        row.debt_type,
+        partial(select_debt_type, app, row.debt_type),
+    )
+
+    if hotkeys:
+        colvir_utils.type_keys(window=change_win, keystrokes="{PGDN}")
+    else:
+        colvir_utils.find_and_click_button(
+            app,
+            change_win,
+            change_controls["Static4"],
+            "Сохранить изменения (PgDn)",
+        )
+    change_win.wait(wait_for="enabled")
+
+
+def cancel_position(
+    app: pywinauto.Application, change_win: pywinauto.WindowSpecification
+) -> None:
+    for title in LOOKUP_TITLES:
+        colvir_utils.close_window(win=app.window(title_re=title))
+    colvir_utils.type_keys(window=change_win, keystrokes="{ESC}")
+    change_win.wait(wait_for="enabled")
+
+
 def fill_order(
     app: pywinauto.Application,
     business_trip_order_win: pywinauto.WindowSpecification,
     now: datetime,
     request: data.Request,
-    rk: bool,
+    rows: batch.RowBatch,
+    lookups: Optional[colvir_utils.LookupCache] = None,
 ) -> str:
+    order_controls = colvir_utils.ControlCache(business_trip_order_win)
+
     business_trip_order_win.menu_select("#0->#5->#0")
     confirm_pay_win = colvir_utils.get_window(
         app=app, title="Подтверждение", wait_for="exists enabled"
@@ -205,8 +437,6 @@ def fill_order(
     )
     payment_win["OK"].click()
 
-    wiggle_mouse(duration=1)
-
     business_trip_order_win.wait(wait_for="enabled", timeout=20)
     business_trip_order_win.menu_select("#0->#5->#1")
 
@@ -218,133 +448,54 @@ def fill_order(
     change_win = colvir_utils.get_window(
         app=app, title="Изменение/добавление позиции"
     )
+    change_controls = colvir_utils.ControlCache(change_win)
 
-    for row in request.rows:
-        colvir_utils.find_and_click_button(
-            app, change_win, change_win["Static4"], "Создать новую запись (Ins)"
-        )
-
-        colvir_utils.type_keys(
-            window=change_win, keystrokes="{ENTER}{SPACE}{ENTER}{RIGHT}"
-        )
-        change_win.type_keys(row.name, with_spaces=True)
-        colvir_utils.type_keys(window=change_win, keystrokes="{ENTER}{RIGHT}")
-        change_win.type_keys(row.sum_tenge, with_spaces=True)
-        colvir_utils.type_keys(window=change_win, keystrokes="{ENTER}{RIGHT}")
-        change_win.type_keys("1", with_spaces=True)
-        colvir_utils.type_keys(window=change_win, keystrokes="{ENTER}{RIGHT 2}")
-
-        time.sleep(1)
-        colvir_utils.type_keys(window=change_win, keystrokes="{ENTER}")
-        time.sleep(1)
-        change_win.type_keys("^{ENTER}")
-        currency_win = colvir_utils.get_window(
-            app=app, title="Валюты", wait_for="exists enabled"
-        )
-        colvir_utils.type_keys(
-            window=currency_win, keystrokes="Z", step_delay=0.5
-        )
-        find_win = colvir_utils.get_window(
-            app=app, title="Найти ", wait_for="exists enabled"
-        )
-        find_win["Edit2"].set_text(row.currency)
-        find_win["OK"].click()
-        currency_win["OK"].click()
-
-        if "с ндс" in row.name.lower():
-            colvir_utils.type_keys(
-                window=change_win, keystrokes="{RIGHT 2}{ENTER}"
-            )
-            change_win.type_keys("^{ENTER}")
-            nds_win = colvir_utils.get_window(
-                app=app, title="Ставки НДС", wait_for="exists enabled"
-            )
-            colvir_utils.type_keys(
-                window=nds_win, keystrokes="Z", step_delay=0.5
-            )
-            find_win = colvir_utils.get_window(
-                app=app, title="Найти код", wait_for="exists enabled"
-            )
-            find_win["Edit2"].set_text("05")
-            find_win["OK"].click()
-            nds_win["OK"].click()
-
-            colvir_utils.type_keys(
-                window=change_win, keystrokes="{RIGHT 3}{ENTER}"
-            )
-        else:
-            colvir_utils.type_keys(
-                window=change_win, keystrokes="{RIGHT 5}{ENTER}"
+    positions = list(rows.colvir_rows())
+    failed = []
+    for i, position in enumerate(positions):
+        try:
+            enter_position(
+                app, change_win, change_controls, *position, lookups=lookups
             )
+        except colvir_utils.SessionAborted as error:
+            raise error
+        except Exception as error:
+            logging.exception(error)
+            cancel_position(app=app, change_win=change_win)
+            failed.append(i)
 
-        kbk, budget_type = get_kbk(text=row.name, rk=rk)
-
-        change_win.type_keys("^{ENTER}")
-        kbk_win = colvir_utils.get_window(
-            app=app, title="Классификатор", wait_for="exists"
-        )
-        colvir_utils.type_keys(window=kbk_win, keystrokes="{F9}")
-
-        dictionary_win = colvir_utils.get_window(
-            app=app, title="Справочник.+", regex=True
-        )
-
-        dictionary_win["Edit2"].set_text(budget_type)
-        assert dictionary_win["Edit2"].window_text() == budget_type
-
-        dictionary_win["Edit4"].set_text(kbk)
-        assert dictionary_win["Edit4"].window_text() == kbk
-
-        dictionary_win["OK"].click()
-
-        result_win = colvir_utils.get_window(
-            app=app, title="Бюджетная классификация.+", regex=True
+    for i in failed:
+        logging.warning(
+            f"Position {rows.rows[i].name!r} was not saved, retrying"
         )
-        result_win["OK"].click()
-
-        colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT}{ENTER}")
-        change_win.type_keys("^{ENTER}")
-        branches_win = colvir_utils.get_window(app=app, title="Подразделения")
-        colvir_utils.type_keys(window=branches_win, keystrokes="{F7}")
-        find_win = colvir_utils.get_window(app=app, title="Поиск")
-        find_win["Edit2"].set_text('001. АО "Банк Развития Казахстана"')
-        find_win["OK"].click()
-        result_win = colvir_utils.get_window(app=app, title="Результаты поиска")
-        result_win["Перейти"].click()
-        branches_win["OK"].click()
-
-        colvir_utils.type_keys(window=change_win, keystrokes="{RIGHT}{ENTER}")
-        change_win.type_keys("^{ENTER}")
-        debt_win = colvir_utils.get_window(
-            app=app, title="Виды дебиторской.+", regex=True
+        enter_position(
+            app, change_win, change_controls, *positions[i], hotkeys=False
         )
-        colvir_utils.type_keys(window=debt_win, keystrokes="{F9}")
-        filter_win = colvir_utils.get_window(app=app, title="Фильтр")
-        filter_win["Edit8"].set_text(row.debt_type)
-        sleep(1)
-        filter_win["OK"].click_input()
-
-        debt_win.wait(wait_for="active enabled")
-        debt_win["OK"].click_input()
 
-        colvir_utils.find_and_click_button(
-            app, change_win, change_win["Static4"], "Сохранить изменения (PgDn)"
+    missing = reconcile.missing_positions(
+        colvir_utils.read_grid(window=change_win, count=len(positions)),
+        rows.rows,
+    )
+    if missing:
+        raise Exception(
+            f"Позиции не сохранены: {[rows.rows[i].name for i in missing]}"
         )
-        change_win.wait(wait_for="enabled")
 
-    change_win["OK"].click()
+    change_controls["OK"].click()
 
     colvir_utils.find_and_click_button(
         app=app,
         window=business_trip_order_win,
-        toolbar=business_trip_order_win["Static3"],
+        toolbar=order_controls["Static3"],
         target_button_name="Авансовый отчет",
     )
 
     report_win = colvir_utils.get_window(
         app=app, title="Авансовый отчет .+", regex=True
     )
+    report_controls = colvir_utils.ControlCache(report_win)
 
+    rows_with_nds = rows.with_nds()
     for _ in request.rows:
         report_win.type_keys("^C")
         current_row_text = pyperclip.paste()
@@ -353,27 +504,26 @@ def fill_order(
             x.replace("\r", "").split("\t")
             for x in current_row_text.split("\n")
         ]
-        required_row = next(
-            row for row in request.rows if row.name == selection[0]
-        )
+        required_index = rows.find(selection[0])
+        required_row = rows.rows[required_index]
 
         colvir_utils.find_and_click_button(
             app=app,
             window=report_win,
-            toolbar=report_win["Static3"],
+            toolbar=report_controls["Static3"],
             target_button_name="Создать дочернюю запись",
         )
 
         colvir_utils.type_keys(window=report_win, keystrokes="{DOWN}{ENTER}")
-        report_win.type_keys(required_row.name, with_spaces=True)
+        colvir_utils.enter_cell_text(report_win, required_row.name)
         colvir_utils.type_keys(
             window=report_win, keystrokes="{ENTER}{RIGHT 3}{ENTER}"
         )
-        report_win.type_keys(required_row.name_num_date, with_spaces=True)
+        colvir_utils.enter_cell_text(report_win, required_row.name_num_date)
         colvir_utils.type_keys(window=report_win, keystrokes="{ENTER}{RIGHT 4}")
         report_win.type_keys(required_row.sum_tenge, with_spaces=True)
         colvir_utils.type_keys(window=report_win, keystrokes="{ENTER}{RIGHT}")
-        if "с ндс" in required_row.name.lower():
+        if rows_with_nds[required_index]:
             colvir_utils.type_keys(
                 window=report_win, keystrokes="{ENTER}{SPACE}{ENTER}{RIGHT}"
             )
@@ -385,7 +535,7 @@ def fill_order(
         colvir_utils.find_and_click_button(
             app=app,
             window=report_win,
-            toolbar=report_win["Static3"],
+            toolbar=report_controls["Static3"],
             target_button_name="Сохранить изменения (PgDn)",
         )
 
@@ -404,12 +554,17 @@ def fill_order(
     approve_win = colvir_utils.get_window(
         app=app, title="Утвердить авансовый отчет", wait_for="exists enabled"
     )
-    approve_win["Edit2"].set_text(now.strftime("%d.%m.%y"))
-    assert approve_win["Edit2"].window_text() == now.strftime("%d.%m.%y")
-    approve_win["OK"].click()
+    approve_controls = colvir_utils.ControlCache(approve_win)
+    forms.fill_form(
+        approve_controls,
+        forms.Form(
+            name="Утвердить авансовый отчет",
+            fields=[forms.Field("Edit2", now.strftime("%d.%m.%y"))],
+        ),
+    )
+    approve_controls["OK"].click()
 
     time.sleep(2)
-    wiggle_mouse(1)
 
     business_trip_order_win.menu_select("#0->#5->#2")
     confirm_accounting_win = colvir_utils.get_window(
@@ -418,17 +573,16 @@ def fill_order(
     confirm_accounting_win["&Да"].click()
 
     time.sleep(5)
-    wiggle_mouse(1)
 
     error_win = app.window(title_re="Произошла ошибка")
     if error_win.exists():
         # make a screenshot
-        raise Exception("")
+        raise Exception(f"Colvir: {error_win.window_text()}")
 
     colvir_utils.find_and_click_button(
         app=app,
         window=business_trip_order_win,
-        toolbar=business_trip_order_win["Static3"],
+        toolbar=order_controls["Static3"],
         target_button_name="Журнал выполненных операций",
     )
 
@@ -438,7 +592,7 @@ def fill_order(
     # journal_win.wait(wait_for="enabled")
     # journal_win.close()
 
-    return business_trip_order_win["Edit46"].window_text().capitalize()
+    return order_controls["Edit46"].window_text().capitalize()
 
 
 def get_from_env(key: str) -> str:
@@ -456,131 +610,364 @@ def parse_name(business_trip_order_win: pywinauto.WindowSpecification) -> str:
     return name
 
 
-def main(bot: TelegramAPI):
-    warnings.simplefilter(action="ignore", category=UserWarning)
-    dotenv.load_dotenv()
+def recover(
+    colvir: colvir_utils.Colvir, app: pywinauto.Application
+) -> pywinauto.Application:
+    try:
+        for title in LOOKUP_TITLES + ORDER_TITLES:
+            colvir_utils.close_window(win=app.window(title_re=title))
+        colvir_utils.choose_mode(app=app, mode="KREQDOC")
+        colvir_utils.get_window(app=app, title="Фильтр")
+        return app
+    except Exception as error:
+        logging.exception(error)
 
-    project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    setup_logger(project_folder=project_folder)
+    app = colvir.restart()
+    colvir_utils.choose_mode(app=app, mode="KREQDOC")
+    return app
 
-    now = datetime.now()
-    logging.info("Start of the process...")
 
-    logging.info(f"{bot=}")
+def process_request(
+    app: pywinauto.Application,
+    request: data.Request,
+    rows: batch.RowBatch,
+    now: datetime,
+    lookups: Optional[colvir_utils.LookupCache] = None,
+) -> Dict[str, str]:
+    order_report = {
+        "№ Приказа": request.order_id,
+        "Статус": "",
+        "Отработан роботом": "",
+    }
+
+    fill_filter_win(app=app, year=now.strftime("%y"), order_id=request.order_id)
+
+    confirm_order_not_exists_win = app.window(title="Подтверждение")
+    if confirm_order_not_exists_win.exists():
+        confirm_order_not_exists_win["&Нет"].click()
+        order_report["Статус"] = "Приказ не найден"
+        order_report["Отработан роботом"] = "Нет. Приказ не найден"
+        return order_report
+
+    main_win = colvir_utils.get_window(
+        app=app, title="Список счетов к оплате", wait_for="exists enabled"
+    )
+    colvir_utils.type_keys(window=main_win, keystrokes="{ENTER}")
+
+    business_trip_order_win = colvir_utils.get_window(
+        app=app, title="Распоряжение на командировку.+", regex=True
+    )
+
+    status = business_trip_order_win["Edit46"].window_text().capitalize()
+    if status.lower() != "введен":
+        order_report["Статус"] = status
+        order_report["Отработан роботом"] = (
+            "Нет. Приказ уже был отработан днями раньше, либо статус не равен "
+            '"Введен"'
+        )
+    else:
+        if request.reimbursement:
+            request.reimbursement.name = parse_name(business_trip_order_win)
+
+        status = fill_order(
+            app=app,
+            business_trip_order_win=business_trip_order_win,
+            now=now,
+            request=request,
+            rows=rows,
+            lookups=lookups,
+        )
+        order_report["Статус"] = status
+        order_report["Отработан роботом"] = "Да"
 
-    driver_path = get_from_env("DRIVER_PATH")
-    bpm_user = get_from_env("BPM_USER")
-    bpm_password = get_from_env("BPM_PASSWORD")
-    colvir_path = get_from_env("COLVIR_PATH")
-    colvir_user = get_from_env("COLVIR_USER")
-    colvir_password = get_from_env("COLVIR_PASSWORD")
+    business_trip_order_win.close()
+    main_win.close()
+    colvir_utils.choose_mode(app=app, mode="KREQDOC")
+    return order_report
+
+
+@dataclasses.dataclass
+class Settings:
+    project_folder: str
+    data_folder: str
+    attachment_folder_path: str
+    driver_path: str
+    bpm_user: str
+    bpm_password: str
+    colvir_path: str
+    colvir_user: str
+    colvir_password: str
+
+    @classmethod
+    def from_env(cls, project_folder: str) -> "Settings":
+        driver_path = get_from_env("DRIVER_PATH")
+        bpm_user = get_from_env("BPM_USER")
+        bpm_password = get_from_env("BPM_PASSWORD")
+        colvir_path = get_from_env("COLVIR_PATH")
+        colvir_user = get_from_env("COLVIR_USER")
+        colvir_password = get_from_env("COLVIR_PASSWORD")
+
+        logging.info(f"{driver_path=}")
+        logging.info(f"{bpm_user=} {bpm_password=}")
+        logging.info(f"{colvir_path=} {colvir_user=} {colvir_password=}")
+
+        data_folder = os.path.join(project_folder, "data")
+        attachment_folder_path = os.path.join(data_folder, "attachments")
+
+        os.makedirs(data_folder, exist_ok=True)
+        os.makedirs(attachment_folder_path, exist_ok=True)
+
+        return cls(
+            project_folder=project_folder,
+            data_folder=data_folder,
+            attachment_folder_path=attachment_folder_path,
+            driver_path=driver_path,
+            bpm_user=bpm_user,
+            bpm_password=bpm_password,
+            colvir_path=colvir_path,
+            colvir_user=colvir_user,
+            colvir_password=colvir_password,
+        )
 
-    logging.info(f"{driver_path=}")
-    logging.info(f"{bpm_user=} {bpm_password=}")
-    logging.info(f"{colvir_path=} {colvir_user=} {colvir_password=}")
+    @property
+    def sample_json_path(self) -> str:
+        return os.path.join(self.data_folder, "sample.json")
 
-    data_folder = os.path.join(project_folder, "data")
-    attachment_folder_path = os.path.join(data_folder, "attachments")
+    @property
+    def cookies_path(self) -> str:
+        return os.path.join(self.data_folder, "bpm_cookies.json")
 
-    os.makedirs(data_folder, exist_ok=True)
-    os.makedirs(attachment_folder_path, exist_ok=True)
+    @property
+    def report_json_path(self) -> str:
+        return os.path.join(self.data_folder, "report.json")
 
-    sample_json_path = os.path.join(data_folder, "sample.json")
-    report_path = os.path.join(attachment_folder_path, "Отчет.xlsx")
+    @property
+    def report_path(self) -> str:
+        return os.path.join(self.attachment_folder_path, "Отчет.xlsx")
 
-    process_utils.kill_all_processes(proc_name="COLVIR")
 
+def run_bpm_stage(
+    settings: Settings, only_urls: Optional[Set[str]] = None
+) -> List[Optional[data.Request]]:
+    profile = os.getenv("BPM_PROFILE", "default")
     bpm.run(
-        executable_path=driver_path,
-        bpm_user=bpm_user,
-        bpm_password=bpm_password,
-        sample_json_path=sample_json_path,
+        executable_path=settings.driver_path,
+        bpm_user=settings.bpm_user,
+        bpm_password=settings.bpm_password,
+        sample_json_path=settings.sample_json_path,
+        base_url=os.getenv("BPM_URL", bpm.BPM_URL),
+        profile=profile,
+        user_data_dir=(
+            os.path.join(settings.data_folder, "chrome_profile")
+            if profile == "fast"
+            else None
+        ),
+        cookies_path=settings.cookies_path,
+        snapshot_folder=(
+            os.path.join(settings.data_folder, "snapshots")
+            if os.getenv("BPM_SNAPSHOTS") == "1"
+            else None
+        ),
+        only_urls=only_urls,
     )
 
-    requests = data.load_json_requests(sample_json_path)
+    requests = data.load_json_requests(settings.sample_json_path)
 
     logging.info(f"{requests=}")
+    return requests
+
 
-    colvir = colvir_utils.Colvir(
-        process_path=colvir_path, user=colvir_user, password=colvir_password
+def run_colvir_stage(
+    settings: Settings,
+    requests: List[Optional[data.Request]],
+    now: datetime,
+) -> List[Dict[str, str]]:
+    data_folder = settings.data_folder
+    colvir_utils.control_stats.reset()
+    forms.retried.clear()
+    retry.reset_stats()
+
+    order_status_cache = status_cache.StatusCache(
+        db_path=os.path.join(data_folder, "status_cache.sqlite3"),
+        reverify_after=timedelta(
+            hours=float(os.getenv("STATUS_REVERIFY_HOURS", "168"))
+        ),
+    )
+
+    reference_mirror = references.References(
+        references_json_path=os.path.join(data_folder, "references.json"),
+        max_age=timedelta(
+            hours=float(os.getenv("REFERENCES_REFRESH_HOURS", "168"))
+        ),
+    )
+
+    plan = planner.build_plan(
+        requests=requests,
+        now=now,
+        order_status_cache=order_status_cache,
+        reference_mirror=reference_mirror,
+    )
+    plan.save(os.path.join(data_folder, "plan.json"))
+    reconcile.save_quarantine(
+        quarantine_json_path=os.path.join(data_folder, "quarantine.json"),
+        entries=[order.reconciliation for order in plan.quarantined],
+        requests=[order.request for order in plan.quarantined],
     )
-    app = colvir.get_app()
-    colvir_utils.choose_mode(app=app, mode="KREQDOC")
 
     report_data = []
-    for request in requests:
+    for order in plan.skipped:
         order_report = {
-            "№ Приказа": request.order_id,
-            "Статус": "",
-            "Отработан роботом": "",
+            "№ Приказа": order.order_id,
+            "Статус": order.cached_status.status if order.cached_status else "",
+            "Отработан роботом": "Нет. " + "; ".join(order.reasons),
         }
+        report_data.append(order_report)
+        logging.info(f"{order_report=}")
+    metrics.ORDERS.inc(len(plan.skipped), outcome="skipped")
 
-        fill_filter_win(
-            app=app, year=now.strftime("%y"), order_id=request.order_id
-        )
-
-        confirm_order_not_exists_win = app.window(title="Подтверждение")
-        if confirm_order_not_exists_win.exists():
-            confirm_order_not_exists_win["&Нет"].click()
-            order_report["Статус"] = "Приказ не найден"
-            order_report["Отработан роботом"] = "Нет. Приказ не найден"
-            report_data.append(order_report)
-            logging.info(f"{order_report=}")
-            continue
-
-        main_win = colvir_utils.get_window(
-            app=app, title="Список счетов к оплате", wait_for="exists enabled"
-        )
-        colvir_utils.type_keys(window=main_win, keystrokes="{ENTER}")
+    if not plan.runnable:
+        order_status_cache.close()
+        return report_data
 
-        business_trip_order_win = colvir_utils.get_window(
-            app=app, title="Распоряжение на командировку.+", regex=True
+    with wiggle.keep_alive():
+        colvir = colvir_utils.Colvir(
+            process_path=settings.colvir_path,
+            user=settings.colvir_user,
+            password=settings.colvir_password,
         )
+        app = colvir.get_app()
+        colvir_utils.choose_mode(app=app, mode="KREQDOC")
 
-        status = business_trip_order_win["Edit46"].window_text().capitalize()
-        if status.lower() != "введен":
-            order_report["Статус"] = status
-            order_report["Отработан роботом"] = (
-                "Нет. Приказ уже был отработан днями раньше, либо статус не равен "
-                '"Введен"'
-            )
-            report_data.append(order_report)
-            business_trip_order_win.close()
-            main_win.close()
+        lookups = colvir_utils.LookupCache(mirror=reference_mirror)
+        colvir_watchdog = watchdog.ColvirWatchdog(pid=app.process)
+        colvir_watchdog.start()
+
+        def process(order: planner.PlannedOrder) -> Dict[str, str]:
+            # NOTE: keep-alive only moves the mouse between orders
+            with wiggle.ui_lock:
+                return process_request(
+                    app=app,
+                    request=order.request,
+                    rows=order.rows,
+                    now=now,
+                    lookups=lookups,
+                )
+
+        def restart() -> None:
+            nonlocal app
+            app = colvir.restart()
             colvir_utils.choose_mode(app=app, mode="KREQDOC")
-            logging.info(f"{order_report=}")
-            continue
+            colvir_watchdog.reset(pid=app.process)
+
+        def recover_app() -> None:
+            nonlocal app
+            app = recover(colvir=colvir, app=app)
+            colvir_watchdog.reset(pid=app.process)
+
+        def record(order_report: Dict[str, str]) -> None:
+            order_status_cache.update(
+                order_id=order_report["№ Приказа"],
+                status=order_report["Статус"],
+                outcome=order_report["Отработан роботом"],
+                now=datetime.now(),
+            )
 
-        if request.reimbursement:
-            request.reimbursement.name = parse_name(business_trip_order_win)
+        queue_report, queue_stats = order_queue.run_queue(
+            orders=plan.runnable,
+            process=process,
+            is_hung=colvir_watchdog.hung.is_set,
+            restart=restart,
+            recover=recover_app,
+            record=record,
+            max_consecutive_failures=int(
+                os.getenv("MAX_CONSECUTIVE_FAILURES", "3")
+            ),
+        )
+        report_data.extend(queue_report)
 
-        status = fill_order(
-            app=app,
-            business_trip_order_win=business_trip_order_win,
-            now=now,
-            request=request,
-            rk=request.rk,
+        colvir_watchdog.stop()
+    order_status_cache.close()
+
+    control_stats = colvir_utils.control_stats
+    logging.info(
+        f"Control cache: {control_stats.hits} hits, "
+        f"{control_stats.misses} misses, "
+        f"{control_stats.invalidations} invalidations, "
+        f"saved ~{control_stats.saved_seconds:.1f}s"
+    )
+    logging.info(
+        f"Lookup dialogs: {sum(lookups.skipped.values())} skipped, "
+        f"{sum(lookups.opened.values())} opened, "
+        f"by dialog {dict(lookups.skipped)}"
+    )
+    logging.info(f"Retries: {retry.summary()}")
+    logging.info(f"Form fields re-entered: {dict(forms.retried)}")
+    order_seconds = queue_stats.order_seconds
+    if order_seconds:
+        logging.info(
+            f"Throughput: {len(order_seconds)} orders, "
+            f"{queue_stats.failures} failed, {sum(order_seconds):.0f}s, "
+            f"{len(order_seconds) * 3600 / sum(order_seconds):.1f} orders/h"
         )
-        order_report["Статус"] = status
-        order_report["Отработан роботом"] = "Да"
-        report_data.append(order_report)
 
-        business_trip_order_win.close()
-        main_win.close()
-        colvir_utils.choose_mode(app=app, mode="KREQDOC")
-        logging.info(f"{order_report=}")
+    process_utils.kill_all_processes("COLVIR")
+    return report_data
+
 
+def write_report(settings: Settings, report_data: List[Dict[str, str]]) -> None:
     logging.info(f"{report_data=}")
     df = pd.DataFrame(report_data)
-    df.to_excel(report_path, index=False)
+    df.to_excel(settings.report_path, index=False)
 
-    process_utils.kill_all_processes("COLVIR")
 
-    send_mail(
+def mail_report(settings: Settings) -> None:
+    if not send_mail(
         subject='Отчет "Учет командировочных"',
         body='Отчет "Учет командировочных"',
-        attachment_folder_path=attachment_folder_path,
-    )
+        attachment_folder_path=settings.attachment_folder_path,
+    ):
+        raise Exception("Failed to send the report mail")
+
+
+def send_report(settings: Settings, report_data: List[Dict[str, str]]) -> None:
+    with metrics.STAGE_SECONDS.time(stage="report"):
+        write_report(settings=settings, report_data=report_data)
+    with metrics.STAGE_SECONDS.time(stage="mail"):
+        mail_report(settings=settings)
+
+
+def main(bot: TelegramAPI):
+    warnings.simplefilter(action="ignore", category=UserWarning)
+    dotenv.load_dotenv()
+
+    project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    setup_logger(project_folder=project_folder)
+    retry.configure(json.loads(os.getenv("RETRY_POLICIES", "{}")))
+
+    now = datetime.now()
+    run_id = now.strftime("%Y%m%d%H%M%S")
+    logging.info("Start of the process...")
+    logging.info(f"{run_id=}")
+
+    logging.info(f"{bot=}")
+
+    settings = Settings.from_env(project_folder)
+    metrics.serve_from_env()
+
+    process_utils.kill_all_processes(proc_name="COLVIR")
+
+    try:
+        with metrics.STAGE_SECONDS.time(stage="scrape"):
+            requests = run_bpm_stage(settings)
+        metrics.publish()
+        with metrics.STAGE_SECONDS.time(stage="post"):
+            report_data = run_colvir_stage(
+                settings=settings, requests=requests, now=now
+            )
+        send_report(settings=settings, report_data=report_data)
+    finally:
+        metrics.LAST_RUN.set(time.time())
+        metrics.publish()
 
     logging.info("Finished")
 
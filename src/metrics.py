@@ -0,0 +1,254 @@
+import contextlib
+import http.server
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "colvir_robot"
+
+Labels = Tuple[Tuple[str, str], ...]
+M = TypeVar("M", bound="Metric")
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels, extra: Optional[Labels] = None) -> str:
+    pairs = list(labels) + list(extra or ())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "unknown"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = f"{PREFIX}_{name}"
+        self.help_text = help_text
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# TYPE {self.name} {self.kind}",
+            f"# HELP {self.name} {escape(self.help_text)}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        super().__init__(name, help_text)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [
+                f"{self.name}_total{format_labels(key)} {format_value(value)}"
+                for key, value in sorted(self.values.items())
+            ]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str) -> None:
+        super().__init__(name, help_text)
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.set(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [
+                f"{self.name}{format_labels(key)} {format_value(value)}"
+                for key, value in sorted(self.values.items())
+            ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, buckets: Sequence[float]
+    ) -> None:
+        super().__init__(name, help_text)
+        self.buckets = sorted(buckets) + [math.inf]
+        self.counts: Dict[Labels, List[int]] = {}
+        self.sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            counts = self.counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.sums[key] = self.sums.get(key, 0.0) + value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for key, counts in sorted(self.counts.items()):
+                for bound, count in zip(self.buckets, counts):
+                    le = (("le", format_value(bound)),)
+                    lines.append(
+                        f"{self.name}_bucket{format_labels(key, le)} {count}"
+                    )
+                lines.append(
+                    f"{self.name}_count{format_labels(key)} {counts[-1]}"
+                )
+                lines.append(
+                    f"{self.name}_sum{format_labels(key)} "
+                    f"{format_value(self.sums[key])}"
+                )
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+ORDERS = registry.register(
+    Counter("orders", "Orders by outcome: scraped, posted, skipped, failed")
+)
+STAGE_SECONDS = registry.register(
+    Gauge("stage_seconds", "Duration of the last run of each stage")
+)
+ORDER_SECONDS = registry.register(
+    Histogram(
+        "order_seconds",
+        "Time to process one order in Colvir",
+        buckets=(30, 60, 120, 180, 300, 600, 900),
+    )
+)
+RETRIES = registry.register(Counter("retries", "Retried calls by policy"))
+RETRY_FAILURES = registry.register(
+    Counter("retry_failures", "Calls that exhausted their retry policy")
+)
+COLVIR_RESTARTS = registry.register(
+    Counter("colvir_restarts", "Colvir restarts after a hang or failure")
+)
+BPM_PAGE_SECONDS = registry.register(
+    Histogram(
+        "bpm_page_seconds",
+        "BPM page load latency",
+        buckets=(0.25, 0.5, 1, 2, 5, 10, 30),
+    )
+)
+LAST_RUN = registry.register(
+    Gauge("last_run_timestamp_seconds", "Unix time the last run finished")
+)
+
+
+def write_textfile(textfile_path: str, metrics: Registry = registry) -> None:
+    temp_path = f"{textfile_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.render())
+    os.replace(temp_path, textfile_path)
+
+
+def publish(metrics: Registry = registry) -> None:
+    textfile_path = os.getenv("METRICS_TEXTFILE")
+    if not textfile_path:
+        return
+    try:
+        write_textfile(textfile_path, metrics)
+    except OSError as error:
+        logging.warning(f"Failed to write metrics to {textfile_path}: {error}")
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    metrics = registry
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def serve(
+    port: int, host: str = "127.0.0.1", metrics: Registry = registry
+) -> http.server.ThreadingHTTPServer:
+    handler = type("Handler", (MetricsHandler,), {"metrics": metrics})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    threading.Thread(
+        target=server.serve_forever, name="Metrics", daemon=True
+    ).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+def serve_from_env() -> Optional[http.server.ThreadingHTTPServer]:
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    return serve(int(port))
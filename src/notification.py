@@ -6,6 +6,8 @@ from typing import Dict, Optional, Tuple
 import requests
 import requests.adapters
 
+import src.retry as retry
+
 
 class TelegramAPI:
     def __init__(self) -> None:
@@ -69,23 +71,23 @@ def send_with_retry(
     chat_id: str,
     message: str,
 ) -> bool:
-    retry = 0
-    while retry < 5:
-        try:
-            use_session = retry < 5
-            success = bot.send_message(token, chat_id, message, use_session)
-            return success
-        except (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.SSLError,
-            requests.exceptions.HTTPError,
-        ) as e:
-            bot.reload_session()
-            logging.exception(e)
-            logging.warning(f"{e} intercepted. Retry {retry + 1}/10")
-            retry += 1
-
-    return False
+    try:
+        return retry.call(
+            "telegram",
+            bot.send_message,
+            token,
+            chat_id,
+            message,
+            retry_on=(
+                requests.exceptions.ConnectionError,
+                requests.exceptions.SSLError,
+                requests.exceptions.HTTPError,
+            ),
+            on_retry=lambda _: bot.reload_session(),
+        )
+    except retry.RetryError as e:
+        logging.exception(e)
+        return False
 
 
 def send_message(
@@ -0,0 +1,129 @@
+import collections
+import dataclasses
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import src.metrics as metrics
+import src.planner as planner
+
+MAX_ORDER_ATTEMPTS = 2
+INTERRUPTED = "Обработка прервана: Colvir не запустился"
+
+OrderReport = Dict[str, str]
+
+
+@dataclasses.dataclass
+class QueueStats:
+    order_seconds: List[float] = dataclasses.field(default_factory=list)
+    failures: int = 0
+
+
+def failed_report(order_id: str, reason: str) -> OrderReport:
+    metrics.ORDERS.inc(outcome="failed")
+    return {
+        "№ Приказа": order_id,
+        "Статус": "",
+        "Отработан роботом": f"Нет. {reason}",
+    }
+
+
+def interrupted_reports(
+    queue: Iterable[planner.PlannedOrder], reason: str
+) -> List[OrderReport]:
+    return [failed_report(pending.order_id, reason) for pending in queue]
+
+
+def run_queue(
+    orders: Iterable[planner.PlannedOrder],
+    process: Callable[[planner.PlannedOrder], OrderReport],
+    is_hung: Callable[[], bool],
+    restart: Callable[[], None],
+    recover: Callable[[], None],
+    record: Callable[[OrderReport], None],
+    max_consecutive_failures: int,
+    max_attempts: int = MAX_ORDER_ATTEMPTS,
+) -> Tuple[List[OrderReport], QueueStats]:
+    queue = collections.deque(orders)
+    attempts: Dict[str, int] = collections.Counter()
+    report_data: List[OrderReport] = []
+    stats = QueueStats()
+    consecutive_failures = 0
+
+    def add(order_reports: List[OrderReport]) -> None:
+        for order_report in order_reports:
+            report_data.append(order_report)
+            record(order_report)
+
+    while queue:
+        order = queue.popleft()
+        logging.info(f"Processing order_id={order.order_id!r}")
+
+        order_start = time.perf_counter()
+        try:
+            order_report = process(order)
+        except Exception as error:
+            logging.exception(error)
+            stats.order_seconds.append(time.perf_counter() - order_start)
+
+            if is_hung():
+                attempts[order.order_id] += 1
+                if attempts[order.order_id] < max_attempts:
+                    queue.append(order)
+                else:
+                    add([failed_report(order.order_id, "Colvir завис")])
+
+                try:
+                    restart()
+                except Exception as restart_error:
+                    logging.exception(restart_error)
+                    add(interrupted_reports(queue, INTERRUPTED))
+                    break
+                continue
+
+            stats.failures += 1
+            consecutive_failures += 1
+            add(
+                [
+                    failed_report(
+                        order.order_id,
+                        f"Ошибка: {str(error) or type(error).__name__}",
+                    )
+                ]
+            )
+
+            if consecutive_failures >= max_consecutive_failures:
+                logging.error(
+                    f"{consecutive_failures} orders failed in a row, stopping"
+                )
+                add(
+                    interrupted_reports(
+                        queue,
+                        "Обработка прервана после "
+                        f"{consecutive_failures} ошибок подряд",
+                    )
+                )
+                break
+
+            try:
+                recover()
+            except Exception as restart_error:
+                logging.exception(restart_error)
+                add(interrupted_reports(queue, INTERRUPTED))
+                break
+            continue
+
+        stats.order_seconds.append(time.perf_counter() - order_start)
+        metrics.ORDER_SECONDS.observe(stats.order_seconds[-1])
+        metrics.ORDERS.inc(
+            outcome=(
+                "posted"
+                if order_report["Отработан роботом"] == "Да"
+                else "skipped"
+            )
+        )
+        consecutive_failures = 0
+        add([order_report])
+        logging.info(f"{order_report=}")
+
+    return report_data, stats
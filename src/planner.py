@@ -0,0 +1,270 @@
+import dataclasses
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import src.batch as batch
+import src.data as data
+import src.reconcile as reconcile
+import src.references as references
+import src.status_cache as status_cache
+
+BASE_SECONDS = 90.0
+ROW_SECONDS = 60.0
+NDS_ROW_SECONDS = 20.0
+REIMBURSEMENT_SECONDS = 60.0
+
+
+@dataclasses.dataclass
+class PlannedOrder:
+    position: int
+    order_id: str
+    action: str
+    reasons: List[str]
+    kbk: List[str]
+    budget_types: List[str]
+    debt_types: List[str]
+    with_nds: List[bool]
+    total: Decimal
+    predicted_seconds: float
+    request: Optional[data.Request] = dataclasses.field(
+        default=None, repr=False
+    )
+    rows: Optional[batch.RowBatch] = dataclasses.field(default=None, repr=False)
+    cached_status: Optional[status_cache.Entry] = dataclasses.field(
+        default=None, repr=False
+    )
+    reconciliation: Optional[reconcile.Reconciliation] = dataclasses.field(
+        default=None, repr=False
+    )
+
+    @property
+    def quarantined(self) -> bool:
+        return self.reconciliation is not None and not self.reconciliation.ok
+
+    @property
+    def signature(self) -> Tuple[bool, Tuple[str, ...], Tuple[str, ...]]:
+        return (
+            any(self.with_nds),
+            tuple(sorted(set(self.kbk))),
+            tuple(sorted(set(self.debt_types))),
+        )
+
+    def to_json(self) -> dict:
+        return {
+            "position": self.position,
+            "order_id": self.order_id,
+            "action": self.action,
+            "reasons": self.reasons,
+            "kbk": self.kbk,
+            "budget_types": self.budget_types,
+            "debt_types": self.debt_types,
+            "with_nds": self.with_nds,
+            "total": str(self.total),
+            "predicted_seconds": self.predicted_seconds,
+        }
+
+
+@dataclasses.dataclass
+class ExecutionPlan:
+    orders: List[PlannedOrder]
+    row_batch: batch.RowBatch
+
+    @property
+    def runnable(self) -> List[PlannedOrder]:
+        return [order for order in self.orders if order.action == "run"]
+
+    @property
+    def skipped(self) -> List[PlannedOrder]:
+        return [order for order in self.orders if order.action == "skip"]
+
+    @property
+    def quarantined(self) -> List[PlannedOrder]:
+        return [order for order in self.orders if order.quarantined]
+
+    @property
+    def predicted_seconds(self) -> float:
+        return sum(order.predicted_seconds for order in self.runnable)
+
+    def save(self, plan_json_path: str) -> None:
+        with open(plan_json_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "predicted_seconds": self.predicted_seconds,
+                    "orders": [order.to_json() for order in self.orders],
+                },
+                f,
+                indent=4,
+                ensure_ascii=False,
+            )
+
+
+def predict_seconds(request: data.Request, with_nds: List[bool]) -> float:
+    seconds = BASE_SECONDS + ROW_SECONDS * len(request.rows)
+    seconds += NDS_ROW_SECONDS * sum(with_nds)
+    if request.reimbursement:
+        seconds += REIMBURSEMENT_SECONDS
+    return seconds
+
+
+def reference_checks(
+    reference_mirror: Optional[references.References],
+    row_batch: batch.RowBatch,
+    kbk: np.ndarray,
+    debt_types: np.ndarray,
+    with_nds: np.ndarray,
+) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+    if reference_mirror is None:
+        return []
+
+    nds_codes = np.full(len(row_batch), references.NDS_CODE)
+    branch_codes = np.full(len(row_batch), references.BRANCH_CODE)
+    return [
+        ("КБК", reference_mirror.unknown(references.KBK, kbk), kbk),
+        (
+            "видов дебиторской задолженности",
+            reference_mirror.unknown(references.DEBT_TYPES, debt_types),
+            debt_types,
+        ),
+        (
+            "валют",
+            reference_mirror.unknown(references.CURRENCIES, row_batch.currency),
+            row_batch.currency,
+        ),
+        (
+            "ставок НДС",
+            with_nds
+            & reference_mirror.unknown(references.NDS_RATES, nds_codes),
+            nds_codes,
+        ),
+        (
+            "подразделений",
+            reference_mirror.unknown(references.BRANCHES, branch_codes),
+            branch_codes,
+        ),
+    ]
+
+
+def build_plan(
+    requests: List[Optional[data.Request]],
+    now: datetime,
+    order_status_cache: Optional[status_cache.StatusCache] = None,
+    reference_mirror: Optional[references.References] = None,
+) -> ExecutionPlan:
+    valid_requests = [request for request in requests if request]
+    row_batch = batch.RowBatch.from_requests(valid_requests)
+    kbk, budget_types = row_batch.kbk()
+    debt_types = row_batch.debt_types()
+    with_nds = row_batch.with_nds()
+    invalid = row_batch.invalid()
+    totals = row_batch.totals()
+    unknown_codes = reference_checks(
+        reference_mirror, row_batch, kbk, debt_types, with_nds
+    )
+
+    orders: List[PlannedOrder] = []
+    seen_order_ids = set()
+    request_index = 0
+    for position, request in enumerate(requests):
+        if request is None:
+            orders.append(
+                PlannedOrder(
+                    position=position,
+                    order_id="",
+                    action="skip",
+                    reasons=["Заявка не прошла валидацию"],
+                    kbk=[],
+                    budget_types=[],
+                    debt_types=[],
+                    with_nds=[],
+                    total=Decimal("0.00"),
+                    predicted_seconds=0.0,
+                )
+            )
+            continue
+
+        start = row_batch.offsets[request_index]
+        stop = row_batch.offsets[request_index + 1]
+        order = PlannedOrder(
+            position=position,
+            order_id=request.order_id,
+            action="run",
+            reasons=[],
+            kbk=kbk[start:stop].tolist(),
+            budget_types=budget_types[start:stop].tolist(),
+            debt_types=debt_types[start:stop].tolist(),
+            with_nds=with_nds[start:stop].tolist(),
+            total=Decimal(str(totals[request_index])).quantize(reconcile.CENT),
+            predicted_seconds=0.0,
+            request=request,
+            rows=row_batch.view(request_index),
+        )
+        request_index += 1
+
+        normalized_order_id = data.normalize_order_id(request.order_id)
+        if normalized_order_id in seen_order_ids:
+            order.action = "skip"
+            order.reasons.append("Дубликат приказа в выгрузке")
+        seen_order_ids.add(normalized_order_id)
+
+        if invalid[start:stop].any():
+            order.action = "skip"
+            order.reasons.append("Некорректная сумма или валюта в строках")
+
+        if not request.rows:
+            order.reasons.append("Нет строк расходов")
+
+        for label, unknown, values in unknown_codes:
+            codes = sorted(
+                set(values[start:stop][unknown[start:stop]].tolist())
+            )
+            if codes:
+                order.action = "skip"
+                order.reasons.append(f"Нет в справочнике {label}: {codes}")
+
+        order.reconciliation = reconcile.reconcile(request)
+        if not order.reconciliation.ok:
+            order.action = "skip"
+            order.reasons.extend(
+                f"Сверка сумм: {reason}"
+                for reason in order.reconciliation.reasons
+            )
+
+        if order_status_cache and order.action != "skip":
+            cached = order_status_cache.should_skip(request.order_id, now)
+            if cached:
+                order.action = "skip"
+                order.cached_status = cached
+                order.reasons.append(
+                    "Статус известен с "
+                    f"{cached.checked_at.strftime('%d.%m.%Y %H:%M')}"
+                )
+
+        if order.action != "skip":
+            order.predicted_seconds = predict_seconds(request, order.with_nds)
+
+        orders.append(order)
+
+    for order in orders:
+        if order.reasons:
+            logging.warning(
+                f"{order.order_id} ({order.action}): {order.reasons}"
+            )
+
+    runnable = sorted(
+        (order for order in orders if order.action == "run"),
+        key=lambda order: order.signature,
+    )
+    skipped = [order for order in orders if order.action != "run"]
+    plan = ExecutionPlan(orders=runnable + skipped, row_batch=row_batch)
+
+    logging.info(
+        f"Execution plan: {len(plan.runnable)} to run, "
+        f"{len(plan.skipped)} skipped, "
+        f"predicted {plan.predicted_seconds / 60:.1f} min"
+    )
+    return plan
@@ -1,24 +1,105 @@
-from typing import Optional
+import logging
+from typing import Dict, List, Optional
 
 import psutil
 
 
-def kill_process(pid: int) -> None:
-    proc = psutil.Process(pid)
-    proc.terminate()
+class ProcessRegistry:
+    def __init__(self) -> None:
+        self.processes: Dict[int, psutil.Process] = {}
 
+    def register(self, pid: int) -> None:
+        try:
+            proc = psutil.Process(pid)
+            self.processes[pid] = proc
+            for child in proc.children(recursive=True):
+                self.processes[child.pid] = child
+        except psutil.NoSuchProcess:
+            return
 
-def kill_all_processes(proc_name: str) -> None:
-    for proc in psutil.process_iter():
-        if proc_name in proc.name():
+    def refresh(self) -> None:
+        for proc in list(self.processes.values()):
             try:
-                proc.terminate()
+                for child in proc.children(recursive=True):
+                    self.processes.setdefault(child.pid, child)
             except (psutil.AccessDenied, psutil.NoSuchProcess):
                 continue
 
+    def alive(self, proc_name: Optional[str] = None) -> List[psutil.Process]:
+        procs = []
+        for proc in self.processes.values():
+            try:
+                if not proc.is_running():
+                    continue
+                if proc_name and proc_name not in proc.name():
+                    continue
+                procs.append(proc)
+            except (psutil.AccessDenied, psutil.NoSuchProcess):
+                continue
+        return procs
+
+    def terminate(self, timeout: float = 5.0) -> int:
+        self.refresh()
+        procs = self.alive()
+        terminate_processes(procs, timeout=timeout)
+        self.processes.clear()
+        return len(procs)
+
+
+registry = ProcessRegistry()
+
+
+def terminate_processes(
+    procs: List[psutil.Process], timeout: float = 5.0
+) -> None:
+    if not procs:
+        return
+
+    for proc in procs:
+        try:
+            proc.terminate()
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            continue
+
+    _, alive = psutil.wait_procs(procs, timeout=timeout)
+    for proc in alive:
+        logging.warning(f"Process {proc.pid} did not terminate, killing")
+        try:
+            proc.kill()
+        except (psutil.AccessDenied, psutil.NoSuchProcess):
+            continue
+    psutil.wait_procs(alive, timeout=timeout)
+
+
+def kill_process(pid: int, timeout: float = 5.0) -> None:
+    try:
+        proc = psutil.Process(pid)
+    except psutil.NoSuchProcess:
+        return
+    terminate_processes([proc], timeout=timeout)
+
+
+def find_processes(proc_name: str) -> List[psutil.Process]:
+    return [
+        proc
+        for proc in psutil.process_iter(["name"])
+        if proc_name in (proc.info["name"] or "")
+    ]
+
+
+def kill_all_processes(
+    proc_name: str, timeout: float = 5.0, orphans: bool = False
+) -> None:
+    terminated = registry.terminate(timeout=timeout)
+
+    # NOTE: a dead launcher leaves its reparented children untracked
+    if orphans or not terminated:
+        terminate_processes(find_processes(proc_name), timeout=timeout)
+
 
 def get_current_process_pid(proc_name: str) -> Optional[int]:
-    return next(
-        (p.pid for p in psutil.process_iter() if proc_name in p.name()),
-        None,
-    )
+    tracked = registry.alive(proc_name)
+    if tracked:
+        return tracked[0].pid
+
+    return next((proc.pid for proc in find_processes(proc_name)), None)
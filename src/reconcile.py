@@ -0,0 +1,148 @@
+import dataclasses
+import json
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+import src.data as data
+
+CENT = Decimal("0.01")
+NAME_PREFIX_LENGTH = 8
+
+
+@dataclasses.dataclass
+class Reconciliation:
+    order_id: str
+    total: Optional[Decimal]
+    reasons: List[str]
+
+    @property
+    def ok(self) -> bool:
+        return not self.reasons
+
+
+def to_decimal(value: str) -> Optional[Decimal]:
+    normalized = value.replace(" ", "").replace("\xa0", "").replace(",", ".")
+    try:
+        amount = Decimal(normalized)
+    except InvalidOperation:
+        return None
+    if not amount.is_finite():
+        return None
+    return amount
+
+
+def reconcile(request: data.Request) -> Reconciliation:
+    reasons: List[str] = []
+
+    amounts = {}
+    for field in ("ob", "oz", "advance"):
+        amount = to_decimal(getattr(request, field))
+        if amount is None:
+            reasons.append(f"{field}: не число ({getattr(request, field)!r})")
+        elif amount != amount.quantize(CENT):
+            reasons.append(f"{field}: больше двух знаков после запятой")
+        amounts[field] = amount
+
+    total = Decimal("0.00")
+    for i, row in enumerate(request.rows, start=1):
+        amount = to_decimal(row.sum_tenge)
+        if amount is None:
+            reasons.append(f"Строка {i}: сумма не число ({row.sum_tenge!r})")
+            continue
+        if amount <= 0:
+            reasons.append(f"Строка {i}: сумма не положительная ({amount})")
+        if amount != amount.quantize(CENT):
+            reasons.append(f"Строка {i}: больше двух знаков после запятой")
+        total += amount
+
+    ob, oz, advance = amounts["ob"], amounts["oz"], amounts["advance"]
+
+    if ob is not None and ob < 0:
+        reasons.append(f"ob отрицательная ({ob})")
+
+    if ob is not None and request.rows and ob > total:
+        reasons.append(f"ob ({ob}) больше суммы строк ({total})")
+
+    if oz is not None:
+        if oz > 0 and request.reimbursement is None:
+            reasons.append(f"Остаток {oz} без данных для удержания")
+        if oz <= 0 and request.reimbursement is not None:
+            reasons.append(f"Данные для удержания при остатке {oz}")
+
+    if None not in (ob, oz, advance):
+        if not request.ppz and advance != 0:
+            reasons.append(f"Аванс {advance} при отсутствии заявки на аванс")
+        elif request.ppz and advance == 0:
+            # NOTE: в старых выгрузках сумма аванса не сохранялась
+            pass
+        elif advance + ob - total != oz:
+            reasons.append(
+                f"Аванс {advance} + ob {ob} - расходы {total} != остаток {oz}"
+            )
+
+    return Reconciliation(
+        order_id=request.order_id,
+        total=total,
+        reasons=reasons,
+    )
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def same_name(cell: str, name: str) -> bool:
+    cell, name = normalize_name(cell), normalize_name(name)
+    if cell == name:
+        return True
+    # NOTE: Colvir обрезает длинные наименования в гриде
+    return len(cell) >= NAME_PREFIX_LENGTH and name.startswith(cell)
+
+
+def missing_positions(
+    grid_rows: List[Dict[str, str]], rows: List[data.Row]
+) -> List[int]:
+    remaining = list(grid_rows)
+    missing = []
+    for i, row in enumerate(rows):
+        amount = to_decimal(row.sum_tenge)
+        match = next(
+            (
+                grid_row
+                for grid_row in remaining
+                if any(
+                    same_name(value, row.name) for value in grid_row.values()
+                )
+                and any(
+                    to_decimal(value) == amount for value in grid_row.values()
+                )
+            ),
+            None,
+        )
+        if match is None:
+            missing.append(i)
+        else:
+            remaining.remove(match)
+    return missing
+
+
+def save_quarantine(
+    quarantine_json_path: str,
+    entries: List[Reconciliation],
+    requests: List[data.Request],
+) -> None:
+    with open(quarantine_json_path, "w", encoding="utf-8") as f:
+        json.dump(
+            [
+                {
+                    "order_id": entry.order_id,
+                    "total": str(entry.total),
+                    "reasons": entry.reasons,
+                    "request": dataclasses.asdict(request),
+                }
+                for entry, request in zip(entries, requests)
+            ],
+            f,
+            indent=4,
+            ensure_ascii=False,
+        )
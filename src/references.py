@@ -0,0 +1,182 @@
+import argparse
+import dataclasses
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+NDS_CODE = "05"
+BRANCH_CODE = "001"
+BRANCH = f'{BRANCH_CODE}. АО "Банк Развития Казахстана"'
+
+KBK = "kbk"
+DEBT_TYPES = "debt_types"
+NDS_RATES = "nds_rates"
+CURRENCIES = "currencies"
+BRANCHES = "branches"
+
+DICTIONARIES = {
+    "Классификатор": KBK,
+    "Виды дебиторской": DEBT_TYPES,
+    "Ставки НДС": NDS_RATES,
+    "Валюты": CURRENCIES,
+    "Подразделения": BRANCHES,
+}
+CODE_COLUMN = "Код"
+
+
+@dataclasses.dataclass
+class Dictionary:
+    codes: Set[str]
+    updated_at: datetime
+    source: str
+
+    def to_json(self) -> dict:
+        return {
+            "codes": sorted(self.codes),
+            "updated_at": self.updated_at.isoformat(timespec="seconds"),
+            "source": self.source,
+        }
+
+
+def normalize_code(code: str) -> str:
+    return str(code).strip().upper()
+
+
+def extract_codes(
+    rows: Iterable[Dict[str, str]], column: Optional[str] = None
+) -> Set[str]:
+    codes = set()
+    for row in rows:
+        if not row:
+            continue
+        value = row.get(column or CODE_COLUMN)
+        if value is None:
+            value = next(iter(row.values()))
+        value = normalize_code(value)
+        if value and value.lower() != "nan":
+            codes.add(value)
+    return codes
+
+
+def read_export(export_path: str, column: Optional[str] = None) -> Set[str]:
+    if export_path.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(export_path, dtype=str)
+    else:
+        df = pd.read_csv(export_path, sep=None, engine="python", dtype=str)
+    return extract_codes(df.fillna("").to_dict("records"), column)
+
+
+class References:
+    def __init__(self, references_json_path: str, max_age: timedelta) -> None:
+        self.references_json_path = references_json_path
+        self.max_age = max_age
+        self.dictionaries: Dict[str, Dictionary] = {}
+        self.in_use: Dict[str, Set[str]] = {}
+
+        if os.path.exists(references_json_path):
+            with open(references_json_path, "r", encoding="utf-8") as f:
+                for name, entry in json.load(f).items():
+                    self.dictionaries[name] = Dictionary(
+                        codes=set(entry["codes"]),
+                        updated_at=datetime.fromisoformat(entry["updated_at"]),
+                        source=entry["source"],
+                    )
+
+    def save(self) -> None:
+        temp_path = f"{self.references_json_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    name: dictionary.to_json()
+                    for name, dictionary in sorted(self.dictionaries.items())
+                },
+                f,
+                indent=4,
+                ensure_ascii=False,
+            )
+        os.replace(temp_path, self.references_json_path)
+
+    def update(self, name: str, codes: Set[str], source: str) -> None:
+        if not codes:
+            return
+        self.dictionaries[name] = Dictionary(
+            codes=codes, updated_at=datetime.now(), source=source
+        )
+        self.save()
+
+    def refresh(self, name: str, codes: Set[str], source: str) -> bool:
+        dictionary = self.dictionaries.get(name)
+        if dictionary is not None:
+            lost = (self.in_use.get(name, set()) & dictionary.codes) - codes
+            if lost:
+                logging.warning(
+                    f"Refreshed {name} lacks codes in use {sorted(lost)}, "
+                    "keeping the mirror"
+                )
+                return False
+        self.update(name, codes, source)
+        return True
+
+    def is_stale(self, name: str, now: Optional[datetime] = None) -> bool:
+        dictionary = self.dictionaries.get(name)
+        if dictionary is None:
+            return True
+        return (now or datetime.now()) - dictionary.updated_at >= self.max_age
+
+    def contains(self, name: str, code: str) -> bool:
+        dictionary = self.dictionaries.get(name)
+        return dictionary is None or normalize_code(code) in dictionary.codes
+
+    def unknown(self, name: str, codes: np.ndarray) -> np.ndarray:
+        dictionary = self.dictionaries.get(name)
+        if not len(codes):
+            return np.zeros(len(codes), dtype=bool)
+        normalized = np.char.upper(np.char.strip(codes.astype(np.str_)))
+        self.in_use.setdefault(name, set()).update(normalized.tolist())
+        if dictionary is None:
+            return np.zeros(len(codes), dtype=bool)
+        return ~np.isin(normalized, list(dictionary.codes))
+
+
+def main() -> None:
+    project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description="Colvir reference mirror")
+    parser.add_argument(
+        "--path",
+        default=os.path.join(project_folder, "data", "references.json"),
+        help="references json",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import", help="import codes from a Colvir export file"
+    )
+    import_parser.add_argument("name", choices=sorted(DICTIONARIES.values()))
+    import_parser.add_argument("export_path")
+    import_parser.add_argument("--column", help=f"default {CODE_COLUMN!r}")
+
+    subparsers.add_parser("show", help="print dictionary sizes")
+
+    args = parser.parse_args()
+
+    references = References(args.path, max_age=timedelta(0))
+    if args.command == "import":
+        codes = read_export(args.export_path, args.column)
+        references.update(args.name, codes, source=args.export_path)
+        print(f"{args.name}: {len(codes)} codes")
+    else:
+        for name, dictionary in sorted(references.dictionaries.items()):
+            print(
+                f"{name}: {len(dictionary.codes)} codes, "
+                f"{dictionary.updated_at:%d.%m.%Y %H:%M}, {dictionary.source}"
+            )
+
+
+if __name__ == "__main__":
+    main()
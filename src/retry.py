@@ -0,0 +1,201 @@
+import dataclasses
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+import src.metrics as metrics
+
+Exceptions = Tuple[Type[BaseException], ...]
+
+
+class RetryError(Exception):
+    pass
+
+
+class CircuitOpen(RetryError):
+    pass
+
+
+@dataclasses.dataclass
+class Policy:
+    attempts: int
+    base_delay: float
+    max_delay: float
+    budget: float
+    jitter: float = 0.5
+    breaker_threshold: int = 3
+    breaker_reset: float = 300.0
+
+
+@dataclasses.dataclass
+class Stats:
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    rejected: int = 0
+    wasted_seconds: float = 0.0
+
+    def to_json(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, reset_after: float) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+POLICIES: Dict[str, Policy] = {
+    "colvir_start": Policy(
+        attempts=10, base_delay=2.0, max_delay=30.0, budget=600.0
+    ),
+    "colvir_focus": Policy(
+        attempts=12, base_delay=0.25, max_delay=5.0, budget=60.0
+    ),
+    "colvir_keys": Policy(
+        attempts=3, base_delay=0.5, max_delay=2.0, budget=10.0
+    ),
+    "bpm": Policy(attempts=4, base_delay=1.0, max_delay=15.0, budget=90.0),
+    "smtp": Policy(attempts=4, base_delay=5.0, max_delay=60.0, budget=180.0),
+    "telegram": Policy(attempts=5, base_delay=1.0, max_delay=30.0, budget=60.0),
+}
+
+lock = threading.Lock()
+stats: Dict[str, Stats] = {name: Stats() for name in POLICIES}
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def configure(overrides: Dict[str, Dict[str, float]]) -> None:
+    for name, values in overrides.items():
+        POLICIES[name] = dataclasses.replace(
+            POLICIES.get(name, Policy(3, 1.0, 30.0, 60.0)), **values
+        )
+        breakers.pop(name, None)
+
+
+def reset(*names: str) -> None:
+    with lock:
+        for name in names:
+            breakers.pop(name, None)
+
+
+def reset_stats() -> None:
+    with lock:
+        stats.clear()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with lock:
+        if name not in breakers:
+            policy = POLICIES[name]
+            breakers[name] = CircuitBreaker(
+                policy.breaker_threshold, policy.breaker_reset
+            )
+        return breakers[name]
+
+
+def get_stats(name: str) -> Stats:
+    return stats.setdefault(name, Stats())
+
+
+def backoff(policy: Policy, retry: int) -> float:
+    delay = min(policy.max_delay, policy.base_delay * 2 ** (retry - 1))
+    return delay * (1 - policy.jitter * random.random())
+
+
+def call(
+    name: str,
+    func: Callable[..., Any],
+    *args,
+    retry_on: Exceptions = (Exception,),
+    give_up: Exceptions = (),
+    on_retry: Optional[Callable[[BaseException], None]] = None,
+    **kwargs,
+) -> Any:
+    policy = POLICIES[name]
+    breaker = get_breaker(name)
+    with lock:
+        get_stats(name).calls += 1
+        if not breaker.allow():
+            get_stats(name).rejected += 1
+            raise CircuitOpen(f"{name}: circuit is open")
+
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        attempt_start = time.monotonic()
+        with lock:
+            get_stats(name).attempts += 1
+        try:
+            result = func(*args, **kwargs)
+        except give_up:
+            raise
+        except retry_on as error:
+            elapsed = time.monotonic() - start
+            delay = backoff(policy, attempt)
+            with lock:
+                get_stats(name).wasted_seconds += (
+                    time.monotonic() - attempt_start
+                )
+
+            if attempt >= policy.attempts or elapsed + delay > policy.budget:
+                with lock:
+                    get_stats(name).failures += 1
+                    breaker.record_failure()
+                metrics.RETRY_FAILURES.inc(policy=name)
+                raise RetryError(
+                    f"{name}: gave up after {attempt} attempts "
+                    f"in {elapsed:.1f}s: {error!r}"
+                ) from error
+
+            logging.warning(
+                f"{name}: attempt {attempt}/{policy.attempts} failed "
+                f"({error!r}), retrying in {delay:.1f}s"
+            )
+            metrics.RETRIES.inc(policy=name)
+            if on_retry:
+                on_retry(error)
+            time.sleep(delay)
+            with lock:
+                get_stats(name).retries += 1
+                get_stats(name).wasted_seconds += delay
+            continue
+
+        with lock:
+            breaker.record_success()
+        return result
+
+
+def summary() -> Dict[str, dict]:
+    with lock:
+        return {
+            name: name_stats.to_json()
+            for name, name_stats in stats.items()
+            if name_stats.calls
+        }
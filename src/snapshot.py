@@ -0,0 +1,220 @@
+import dataclasses
+import datetime
+import gzip
+import hashlib
+import html.parser
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+MANIFEST_NAME = "manifest.jsonl"
+OBJECTS_FOLDER = "objects"
+
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+BLOCK_TAGS = {"div", "p", "tr", "td", "th", "li", "table"}
+IRRELEVANT_PATTERN = re.compile(
+    r"<(script|style|svg|noscript)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE
+)
+
+
+@dataclasses.dataclass
+class Node:
+    tag: str
+    attrs: Dict[str, str]
+    children: List[Union["Node", str]] = dataclasses.field(default_factory=list)
+
+    @property
+    def classes(self) -> List[str]:
+        return self.attrs.get("class", "").split()
+
+    def iter(self) -> Iterator["Node"]:
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+                yield from child.iter()
+
+    def find(self, predicate) -> Optional["Node"]:
+        return next((node for node in self.iter() if predicate(node)), None)
+
+    def find_all(self, predicate) -> List["Node"]:
+        return [node for node in self.iter() if predicate(node)]
+
+    def text(self) -> str:
+        parts: List[str] = []
+        self._collect_text(parts)
+        lines = (
+            re.sub(r"[ \t\r\f\v]+", " ", line)
+            for line in "".join(parts).split("\n")
+        )
+        return "\n".join(line.strip() for line in lines if line.strip())
+
+    def _collect_text(self, parts: List[str]) -> None:
+        for child in self.children:
+            if isinstance(child, str):
+                parts.append(re.sub(r"\s+", " ", child))
+            elif child.tag == "br":
+                parts.append("\n")
+            elif child.tag in BLOCK_TAGS:
+                parts.append("\n")
+                child._collect_text(parts)
+                parts.append("\n")
+            else:
+                child._collect_text(parts)
+
+
+class TreeBuilder(html.parser.HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Node(tag="document", attrs={})
+        self.stack = [self.root]
+
+    def handle_starttag(
+        self, tag: str, attrs: List[Tuple[str, Optional[str]]]
+    ) -> None:
+        node = Node(tag=tag, attrs={key: value or "" for key, value in attrs})
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_endtag(self, tag: str) -> None:
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, text: str) -> None:
+        self.stack[-1].children.append(text)
+
+
+def parse_html(page_source: str) -> Node:
+    builder = TreeBuilder()
+    builder.feed(page_source)
+    builder.close()
+    return builder.root
+
+
+def strip_irrelevant(page_source: str) -> str:
+    return IRRELEVANT_PATTERN.sub("", page_source)
+
+
+def object_path(snapshot_folder: str, digest: str) -> str:
+    return os.path.join(
+        snapshot_folder, OBJECTS_FOLDER, digest[:2], f"{digest}.html.gz"
+    )
+
+
+def store(snapshot_folder: str, page_source: str, url: str) -> str:
+    content = strip_irrelevant(page_source).encode("utf-8")
+    digest = hashlib.sha256(content).hexdigest()
+
+    path = object_path(snapshot_folder, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(gzip.compress(content, mtime=0))
+        os.replace(temp_path, path)
+
+    entry = {
+        "digest": digest,
+        "url": url,
+        "scraped_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(
+        os.path.join(snapshot_folder, MANIFEST_NAME), "a", encoding="utf-8"
+    ) as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    return digest
+
+
+def load(snapshot_folder: str, digest: str) -> str:
+    with gzip.open(object_path(snapshot_folder, digest), "rb") as f:
+        return f.read().decode("utf-8")
+
+
+def iter_manifest(snapshot_folder: str) -> Iterator[Dict[str, str]]:
+    manifest_path = os.path.join(snapshot_folder, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def latest_digests(snapshot_folder: str) -> List[str]:
+    latest: Dict[str, str] = {}
+    for entry in iter_manifest(snapshot_folder):
+        latest[entry["url"]] = entry["digest"]
+    return list(dict.fromkeys(latest.values()))
+
+
+class SnapshotPage:
+    def __init__(self, page_source: str) -> None:
+        self.root = parse_html(page_source)
+
+    def read_field(
+        self, label: str, class_name: str, default: Optional[str] = None
+    ) -> str:
+        field = self.root.find(
+            lambda node: node.attrs.get("data-field-label") == label
+        )
+        value = (
+            field.find(lambda node: node.attrs.get("class") == class_name)
+            if field
+            else None
+        )
+        if value is None:
+            if not default:
+                raise LookupError(f"Field {label!r} not found in snapshot")
+            return default
+        return value.text()
+
+    def read_table(self) -> Tuple[List[str], List[str]]:
+        box = self.root.find(
+            lambda node: "udf_box_content" in node.classes
+            and "udf_box_content_84661" in node.classes
+        )
+        table = (
+            box.find(lambda node: "obj_table" in node.classes) if box else None
+        )
+        if table is None:
+            raise LookupError("Expense table not found in snapshot")
+
+        header_row = table.find(
+            lambda node: node.tag == "tr"
+            and "obj_tbl_header" in node.classes
+            and "js_hidden" not in node.classes
+        )
+        if header_row is None:
+            raise LookupError("Expense table header not found in snapshot")
+        headers = [header for header in header_row.text().split("\n") if header]
+
+        cells = [
+            value.text()
+            for row in table.find_all(
+                lambda node: node.tag == "tr" and "data-row" in node.attrs
+            )
+            for cell in row.children
+            if isinstance(cell, Node) and cell.tag == "td"
+            for value in cell.children
+            if isinstance(value, Node) and "obj_table_value" in value.classes
+        ]
+        return headers, cells
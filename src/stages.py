@@ -0,0 +1,262 @@
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import sys
+import traceback
+import warnings
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import dotenv
+
+import main as robot
+
+try:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import src.data as data
+    import src.metrics as metrics
+    import src.process_utils as process_utils
+    import src.retry as retry
+    from src.logger import setup_logger
+except Exception as exc:
+    exception_traceback = traceback.format_exc()
+    raise exc
+
+STAGES_NAME = "stages.json"
+
+
+class StageError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class Stage:
+    name: str
+    inputs: Callable[[robot.Settings], List[str]]
+    outputs: Callable[[robot.Settings], List[str]]
+    run: Callable[[robot.Settings], None]
+    depends: List[str] = dataclasses.field(default_factory=list)
+    volatile: bool = False
+
+
+def fingerprint(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprints(paths: List[str]) -> Dict[str, Optional[str]]:
+    return {path: fingerprint(path) for path in paths}
+
+
+def scrape(settings: robot.Settings) -> None:
+    robot.run_bpm_stage(settings)
+
+
+def post(settings: robot.Settings) -> None:
+    process_utils.kill_all_processes(proc_name="COLVIR")
+    report_data = robot.run_colvir_stage(
+        settings=settings,
+        requests=data.load_json_requests(settings.sample_json_path),
+        now=datetime.now(),
+    )
+    with open(settings.report_json_path, "w", encoding="utf-8") as f:
+        json.dump(report_data, f, indent=4, ensure_ascii=False)
+
+
+def report(settings: robot.Settings) -> None:
+    with open(settings.report_json_path, "r", encoding="utf-8") as f:
+        report_data = json.load(f)
+    robot.write_report(settings=settings, report_data=report_data)
+
+
+def mail(settings: robot.Settings) -> None:
+    robot.mail_report(settings=settings)
+
+
+STAGES = [
+    Stage(
+        name="scrape",
+        inputs=lambda settings: [],
+        outputs=lambda settings: [settings.sample_json_path],
+        run=scrape,
+        volatile=True,
+    ),
+    Stage(
+        name="post",
+        inputs=lambda settings: [settings.sample_json_path],
+        outputs=lambda settings: [settings.report_json_path],
+        run=post,
+        depends=["scrape"],
+    ),
+    Stage(
+        name="report",
+        inputs=lambda settings: [settings.report_json_path],
+        outputs=lambda settings: [settings.report_path],
+        run=report,
+        depends=["post"],
+    ),
+    Stage(
+        name="mail",
+        inputs=lambda settings: [settings.report_path],
+        outputs=lambda settings: [],
+        run=mail,
+        depends=["report"],
+    ),
+]
+
+
+def topological_order(stages: List[Stage]) -> List[Stage]:
+    by_name = {stage.name: stage for stage in stages}
+    ordered: List[Stage] = []
+    visiting = set()
+
+    def visit(stage: Stage) -> None:
+        if any(seen.name == stage.name for seen in ordered):
+            return
+        if stage.name in visiting:
+            raise StageError(f"Cycle at stage {stage.name!r}")
+        visiting.add(stage.name)
+        for name in stage.depends:
+            visit(by_name[name])
+        visiting.discard(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+def select(
+    stages: List[Stage],
+    only: Optional[List[str]] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> List[Stage]:
+    ordered = topological_order(stages)
+    names = [stage.name for stage in ordered]
+    for name in (only or []) + [start or names[0], end or names[-1]]:
+        if name not in names:
+            raise StageError(f"Unknown stage {name!r}, expected one of {names}")
+
+    if only:
+        return [stage for stage in ordered if stage.name in only]
+    return ordered[
+        names.index(start or names[0]) : names.index(end or names[-1]) + 1
+    ]
+
+
+class StageRunner:
+    def __init__(self, settings: robot.Settings, stages: List[Stage]) -> None:
+        self.settings = settings
+        self.stages = stages
+        self.state_json_path = os.path.join(settings.data_folder, STAGES_NAME)
+        self.state: Dict[str, dict] = {}
+
+        if os.path.exists(self.state_json_path):
+            with open(self.state_json_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save(self) -> None:
+        temp_path = f"{self.state_json_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=4, ensure_ascii=False)
+        os.replace(temp_path, self.state_json_path)
+
+    def is_fresh(self, stage: Stage) -> bool:
+        record = self.state.get(stage.name)
+        if stage.volatile or record is None:
+            return False
+        return record["inputs"] == fingerprints(
+            stage.inputs(self.settings)
+        ) and record["outputs"] == fingerprints(stage.outputs(self.settings))
+
+    def status(self, stage: Stage) -> str:
+        record = self.state.get(stage.name)
+        if record is None:
+            return "never run"
+        return (
+            f"{'fresh' if self.is_fresh(stage) else 'stale'}, "
+            f"last run {record['finished_at']}"
+        )
+
+    def run(self, selected: List[Stage], force: bool = False) -> None:
+        for stage in selected:
+            if not force and self.is_fresh(stage):
+                logging.info(f"Stage {stage.name}: inputs unchanged, skipped")
+                continue
+
+            missing = [
+                path
+                for path in stage.inputs(self.settings)
+                if not os.path.exists(path)
+            ]
+            if missing:
+                raise StageError(
+                    f"Stage {stage.name}: missing inputs {missing}, "
+                    f"run {stage.depends} first"
+                )
+
+            logging.info(f"Stage {stage.name}: running")
+            inputs = fingerprints(stage.inputs(self.settings))
+            if self.state.pop(stage.name, None) is not None:
+                self.save()
+            with metrics.STAGE_SECONDS.time(stage=stage.name):
+                stage.run(self.settings)
+
+            self.state[stage.name] = {
+                "inputs": inputs,
+                "outputs": fingerprints(stage.outputs(self.settings)),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self.save()
+            metrics.publish()
+
+
+def main() -> None:
+    names = [stage.name for stage in topological_order(STAGES)]
+
+    parser = argparse.ArgumentParser(description="Run pipeline stages")
+    parser.add_argument(
+        "--stage", action="append", choices=names, help="run only this stage"
+    )
+    parser.add_argument("--from", dest="start", choices=names)
+    parser.add_argument("--to", dest="end", choices=names)
+    parser.add_argument(
+        "--force", action="store_true", help="run even if inputs are unchanged"
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="print stage status and exit"
+    )
+    args = parser.parse_args()
+
+    warnings.simplefilter(action="ignore", category=UserWarning)
+    dotenv.load_dotenv()
+
+    project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    setup_logger(project_folder=project_folder)
+    retry.configure(json.loads(os.getenv("RETRY_POLICIES", "{}")))
+
+    settings = robot.Settings.from_env(project_folder)
+    runner = StageRunner(settings=settings, stages=STAGES)
+
+    if args.status:
+        for stage in topological_order(STAGES):
+            print(f"{stage.name}: {runner.status(stage)}")
+        return
+
+    runner.run(
+        select(STAGES, only=args.stage, start=args.start, end=args.end),
+        force=args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import dataclasses
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional
+
+import src.data as data
+
+PENDING_STATUS = "введен"
+NOT_FOUND_STATUS = "Приказ не найден"
+
+
+@dataclasses.dataclass
+class Entry:
+    order_id: str
+    status: str
+    checked_at: datetime
+    outcome: str
+
+
+class StatusCache:
+    def __init__(self, db_path: str, reverify_after: timedelta) -> None:
+        self.reverify_after = reverify_after
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            "order_id TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "checked_at TEXT NOT NULL, "
+            "outcome TEXT NOT NULL)"
+        )
+        self.skipped = 0
+
+    def get(self, order_id: str) -> Optional[Entry]:
+        row = self.conn.execute(
+            "SELECT order_id, status, checked_at, outcome FROM orders "
+            "WHERE order_id = ?",
+            (data.normalize_order_id(order_id),),
+        ).fetchone()
+        if row is None:
+            return None
+        return Entry(
+            order_id=row[0],
+            status=row[1],
+            checked_at=datetime.fromisoformat(row[2]),
+            outcome=row[3],
+        )
+
+    def should_skip(self, order_id: str, now: datetime) -> Optional[Entry]:
+        entry = self.get(order_id)
+        if (
+            entry is None
+            or entry.status.lower() in ("", PENDING_STATUS)
+            or entry.status == NOT_FOUND_STATUS
+            or now - entry.checked_at >= self.reverify_after
+        ):
+            return None
+        self.skipped += 1
+        return entry
+
+    def update(
+        self, order_id: str, status: str, outcome: str, now: datetime
+    ) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?)",
+                (
+                    data.normalize_order_id(order_id),
+                    status,
+                    now.isoformat(timespec="seconds"),
+                    outcome,
+                ),
+            )
+
+    def close(self) -> None:
+        self.conn.close()
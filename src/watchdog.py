@@ -0,0 +1,152 @@
+import dataclasses
+import logging
+import threading
+import time
+from typing import List, Optional
+
+import psutil
+
+import src.process_utils as process_utils
+
+
+@dataclasses.dataclass
+class Sample:
+    alive: bool
+    responsive: bool
+    cpu_percent: float = 0.0
+    num_threads: int = 0
+
+
+def get_process_windows(pid: int) -> List[int]:
+    import win32gui
+    import win32process
+
+    handles = []
+
+    def callback(handle: int, _) -> bool:
+        if win32gui.IsWindowVisible(handle):
+            _, window_pid = win32process.GetWindowThreadProcessId(handle)
+            if window_pid == pid:
+                handles.append(handle)
+        return True
+
+    win32gui.EnumWindows(callback, None)
+    return handles
+
+
+def is_window_responsive(handle: int, timeout_ms: int) -> bool:
+    import pywintypes
+    import win32con
+    import win32gui
+
+    try:
+        win32gui.SendMessageTimeout(
+            handle,
+            win32con.WM_NULL,
+            0,
+            0,
+            win32con.SMTO_ABORTIFHUNG,
+            timeout_ms,
+        )
+        return True
+    except pywintypes.error:
+        return False
+
+
+class ColvirWatchdog(threading.Thread):
+    def __init__(
+        self,
+        pid: int,
+        interval: float = 1.0,
+        hang_timeout: float = 30.0,
+        idle_hang_timeout: float = 10.0,
+        probe_timeout_ms: int = 1000,
+    ) -> None:
+        super().__init__(name="ColvirWatchdog", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.hang_timeout = hang_timeout
+        self.idle_hang_timeout = idle_hang_timeout
+        self.probe_timeout_ms = probe_timeout_ms
+
+        self.hung = threading.Event()
+        self.stop_event = threading.Event()
+        self.unresponsive_since: Optional[float] = None
+        self.detected_at: Optional[float] = None
+        self.process: Optional[psutil.Process] = None
+
+    def reset(self, pid: int) -> None:
+        self.pid = pid
+        self.process = None
+        self.unresponsive_since = None
+        self.detected_at = None
+        self.hung.clear()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def is_responsive(self) -> bool:
+        handles = get_process_windows(self.pid)
+        if not handles:
+            return True
+        return all(
+            is_window_responsive(handle, self.probe_timeout_ms)
+            for handle in handles
+        )
+
+    def sample(self) -> Sample:
+        try:
+            if self.process is None or self.process.pid != self.pid:
+                self.process = psutil.Process(self.pid)
+                self.process.cpu_percent()
+            with self.process.oneshot():
+                if self.process.status() == psutil.STATUS_ZOMBIE:
+                    return Sample(alive=False, responsive=False)
+                cpu_percent = self.process.cpu_percent()
+                num_threads = self.process.num_threads()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return Sample(alive=False, responsive=False)
+
+        return Sample(
+            alive=True,
+            responsive=self.is_responsive(),
+            cpu_percent=cpu_percent,
+            num_threads=num_threads,
+        )
+
+    def is_dead(self, sample: Sample, now: float) -> bool:
+        if not sample.alive:
+            return True
+
+        if sample.responsive:
+            self.unresponsive_since = None
+            return False
+
+        if self.unresponsive_since is None:
+            self.unresponsive_since = now
+
+        unresponsive_for = now - self.unresponsive_since
+        if (
+            sample.cpu_percent < 1.0
+            and unresponsive_for >= self.idle_hang_timeout
+        ):
+            return True
+        return unresponsive_for >= self.hang_timeout
+
+    def on_hang(self, sample: Sample) -> None:
+        import src.colvir_utils as colvir_utils
+
+        self.detected_at = time.monotonic()
+        logging.error(f"Colvir session is dead: {self.pid=} {sample=}")
+        colvir_utils.session_aborted.set()
+        process_utils.kill_all_processes("COLVIR")
+        self.hung.set()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            if self.hung.is_set():
+                continue
+
+            sample = self.sample()
+            if self.is_dead(sample, time.monotonic()):
+                self.on_hang(sample)
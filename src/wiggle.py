@@ -1,10 +1,27 @@
+import contextlib
+import logging
+import os
 import random
-from typing import Tuple
+import threading
+from functools import wraps
+from typing import Any, Callable, Iterator, Tuple
 
 import pyautogui
+import win32api
 
 pyautogui.FAILSAFE = False
 
+ui_lock = threading.RLock()
+
+
+def holds_ui(func: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> Any:
+        with ui_lock:
+            return func(*args, **kwargs)
+
+    return wrapper
+
 
 def wiggle_mouse(duration: int) -> None:
     max_wiggles = random.randint(4, 9)
@@ -21,3 +38,52 @@ def get_random_coords() -> Tuple[int, int]:
     height = screen[1]
 
     return random.randint(100, width - 200), random.randint(100, height - 200)
+
+
+def get_idle_seconds() -> float:
+    return (win32api.GetTickCount() - win32api.GetLastInputInfo()) / 1000
+
+
+class KeepAlive(threading.Thread):
+    def __init__(
+        self,
+        idle_period: float = 60.0,
+        duration: int = 1,
+        interval: float = 5.0,
+    ) -> None:
+        super().__init__(name="KeepAlive", daemon=True)
+        self.idle_period = idle_period
+        self.duration = duration
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.wiggles = 0
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            if get_idle_seconds() < self.idle_period:
+                continue
+
+            if not ui_lock.acquire(blocking=False):
+                continue
+            try:
+                wiggle_mouse(duration=self.duration)
+                self.wiggles += 1
+            except (Exception, BaseException) as error:
+                logging.exception(error)
+            finally:
+                ui_lock.release()
+
+
+@contextlib.contextmanager
+def keep_alive() -> Iterator[KeepAlive]:
+    idle_period = float(os.getenv("KEEP_ALIVE_IDLE_SECONDS", "60"))
+    service = KeepAlive(idle_period=idle_period)
+    service.start()
+    try:
+        yield service
+    finally:
+        service.stop()
+        logging.info(f"Keep-alive wiggles: {service.wiggles}")
@@ -0,0 +1,67 @@
+import json
+import logging
+
+import pytest
+
+import src.audit as audit
+
+
+def json_request(order_id: str, sum_tenge: str, oz: str) -> dict:
+    return {
+        "order_id": order_id,
+        "rk": True,
+        "ob": "0.00",
+        "ppz": False,
+        "advance": "0.00",
+        "oz": oz,
+        "order_type": "Командировка",
+        "reimbursement": None,
+        "rows": [
+            {
+                "name": "Суточные",
+                "name_num_date": "Приказ №1 от 01.01.2024",
+                "sum_tenge": sum_tenge,
+                "currency": "KZT",
+                "debt_type": "1",
+            }
+        ],
+    }
+
+
+@pytest.fixture
+def sample_folder(tmp_path):
+    sample_json = [
+        json_request("101-I", "12000.00", "-12000.00"),
+        json_request("102-I", "не сумма", "0.00"),
+        json_request("103-I", "8000.00", "-8000.00"),
+    ]
+    (tmp_path / "sample.json").write_text(
+        json.dumps(sample_json, ensure_ascii=False), encoding="utf-8"
+    )
+    return tmp_path
+
+
+@pytest.fixture
+def quiet_root():
+    logger = logging.getLogger()
+    level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    yield
+    logger.setLevel(level)
+
+
+def test_audit_file_counts_validation_failures(sample_folder, quiet_root):
+    summary = audit.audit_file(str(sample_folder / "sample.json"))
+
+    assert summary.requests == 3
+    assert summary.requests_invalid == 1
+    assert summary.validation_failures == {"row sum_tenge": 1}
+    assert logging.getLogger().level == logging.CRITICAL
+
+
+def test_audit_counts_validation_failures_in_workers(sample_folder, quiet_root):
+    summary = audit.audit(str(sample_folder), workers=1)
+
+    assert summary.files == 1
+    assert summary.requests_invalid == 1
+    assert summary.to_json()["validation_failures"] == {"row sum_tenge": 1}
@@ -0,0 +1,172 @@
+import json
+import logging
+import queue
+import threading
+import urllib.parse
+
+import pytest
+
+http = pytest.importorskip("requests")
+pytest.importorskip("selenium")
+
+import src.bpm as bpm
+import src.bpm_server as bpm_server
+
+CONFIG = bpm_server.ServerConfig(orders=95, page_size=10, state_share=0.6)
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = bpm_server.serve(CONFIG, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session(base_url):
+    session = http.Session()
+    response = session.post(
+        f"{base_url}/login",
+        data={"u_login": CONFIG.user, "pwd": CONFIG.password, "next": "/"},
+        allow_redirects=False,
+    )
+    assert response.status_code == 303
+    return session
+
+
+@pytest.fixture
+def cookies_path(tmp_path, session):
+    cookies_path = tmp_path / "cookies.json"
+    cookies_path.write_text(
+        json.dumps(
+            [
+                {
+                    "name": cookie.name,
+                    "value": cookie.value,
+                    "domain": "127.0.0.1",
+                    "path": "/",
+                }
+                for cookie in session.cookies
+            ]
+        ),
+        encoding="utf-8",
+    )
+    return str(cookies_path)
+
+
+def expected_urls(base_url):
+    return [
+        urllib.parse.urljoin(base_url, f"/?s=obj_a&gid=873&id={id}")
+        for id in range(1, CONFIG.orders + 1)
+        if bpm_server.order_state(CONFIG.seed, id, CONFIG.state_share)
+        == bpm.STATE
+    ]
+
+
+def test_poll_list_pages_through_all_requests(base_url, cookies_path):
+    expected = expected_urls(base_url)
+    assert len(expected) > 2 * CONFIG.page_size
+
+    entries = bpm.poll_list(cookies_path=cookies_path, base_url=base_url)
+
+    assert [entry.url for entry in entries] == expected
+    assert all(bpm.STATE in entry.text for entry in entries)
+
+
+def test_first_and_next_pages_are_filtered_alike(base_url, session):
+    first_page = bpm.parse_list_page(
+        bpm.get_page(session, bpm.list_page_url(base_url, 1, bpm.STATE)).text,
+        base_url,
+        bpm.STATE,
+    )
+    entries: "queue.Queue" = queue.Queue()
+    bpm.fetch_list_pages(session, base_url, bpm.STATE, entries)
+
+    urls = [entry.url for entry in first_page]
+    while (entry := entries.get()) is not None:
+        urls.append(entry.url)
+
+    assert urls == expected_urls(base_url)
+
+
+def test_unfiltered_page_keeps_only_state_rows(base_url, session):
+    page_source = bpm.get_page(session, f"{base_url}/?s=obj_a&gid=873").text
+
+    entries = bpm.parse_list_page(page_source, base_url, bpm.STATE)
+
+    assert 0 < len(entries) < CONFIG.page_size
+    assert all(bpm.STATE in entry.text for entry in entries)
+
+
+def test_poll_list_without_session(base_url, tmp_path):
+    cookies_path = tmp_path / "cookies.json"
+    cookies_path.write_text(
+        json.dumps(
+            [
+                {
+                    "name": bpm_server.SESSION_COOKIE,
+                    "value": "stale",
+                    "domain": "127.0.0.1",
+                }
+            ]
+        ),
+        encoding="utf-8",
+    )
+
+    assert (
+        bpm.poll_list(cookies_path=str(cookies_path), base_url=base_url) is None
+    )
+
+
+def test_page_without_matching_rows_warns(base_url, session, caplog):
+    page_source = bpm.get_page(
+        session, bpm.list_page_url(base_url, 1, "Черновик")
+    ).text
+
+    with caplog.at_level(logging.WARNING):
+        entries = bpm.parse_list_page(page_source, base_url, bpm.STATE)
+
+    assert entries == []
+    assert "rows but none parsed" in caplog.text
+
+
+class ErrorPageDriver:
+    current_url = "https://bpm.example/error"
+
+    def get(self, url):
+        self.current_url = url
+
+
+class TimeoutWait:
+    def until(self, condition):
+        raise bpm.TimeoutException("no login form and no list")
+
+
+def test_unexpected_page_is_not_logged_in():
+    assert not bpm.is_logged_in(ErrorPageDriver(), TimeoutWait())
+
+
+def test_open_session_logs_in_after_unexpected_page(monkeypatch, tmp_path):
+    logins = []
+    monkeypatch.setattr(bpm, "restore_cookies", lambda *args: True)
+    monkeypatch.setattr(bpm, "login", lambda **kwargs: logins.append(kwargs))
+    monkeypatch.setattr(bpm, "save_cookies", lambda *args: None)
+
+    class ErrorPageThenListWait(TimeoutWait):
+        def until(self, condition):
+            if not logins:
+                super().until(condition)
+            return object()
+
+    bpm.open_session(
+        ErrorPageDriver(),
+        ErrorPageThenListWait(),
+        bpm_user=CONFIG.user,
+        bpm_password=CONFIG.password,
+        cookies_path=str(tmp_path / "cookies.json"),
+    )
+
+    assert len(logins) == 1
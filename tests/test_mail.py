@@ -0,0 +1,47 @@
+import smtplib
+
+import pytest
+
+import src.mail as mail
+import src.retry as retry
+
+
+class RefusingSMTP:
+    connections = 0
+
+    def __init__(self, server: str, port: int) -> None:
+        RefusingSMTP.connections += 1
+
+    def __enter__(self) -> "RefusingSMTP":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def sendmail(self, sender, recipients, message) -> dict:
+        raise smtplib.SMTPRecipientsRefused(
+            {recipient: (550, b"No such user") for recipient in recipients}
+        )
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    monkeypatch.setenv("SMTP_SERVER", "localhost")
+    monkeypatch.setenv("SMTP_SENDER", "robot@example.com")
+    monkeypatch.setenv("SMTP_RECIPIENTS", "nobody@example.com")
+    monkeypatch.setattr(mail.smtplib, "SMTP", RefusingSMTP)
+    monkeypatch.setattr(
+        retry.time, "sleep", lambda seconds: pytest.fail("retried")
+    )
+    retry.reset("smtp")
+    yield tmp_path
+    retry.reset("smtp")
+
+
+def test_refused_recipients_are_not_retried(env):
+    RefusingSMTP.connections = 0
+
+    assert not mail.send_mail("subject", "body", str(env))
+
+    assert RefusingSMTP.connections == 1
+    assert retry.get_breaker("smtp").state == "closed"
@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Set
+
+import pytest
+
+import src.order_queue as order_queue
+import src.planner as planner
+import src.status_cache as status_cache
+
+
+def planned(order_id: str) -> planner.PlannedOrder:
+    return planner.PlannedOrder(
+        position=0,
+        order_id=order_id,
+        action="run",
+        reasons=[],
+        kbk=[],
+        budget_types=[],
+        debt_types=[],
+        with_nds=[],
+        total=Decimal("0.00"),
+        predicted_seconds=0.0,
+    )
+
+
+class FakeColvir:
+    def __init__(
+        self,
+        fail: Set[str] = frozenset(),
+        hang: Set[str] = frozenset(),
+        restart_fails: bool = False,
+    ) -> None:
+        self.fail = set(fail)
+        self.hang = set(hang)
+        self.restart_fails = restart_fails
+        self.hung = False
+        self.processed: List[str] = []
+        self.restarts = 0
+        self.recoveries = 0
+        self.recorded: List[Dict[str, str]] = []
+
+    def process(self, order: planner.PlannedOrder) -> Dict[str, str]:
+        self.processed.append(order.order_id)
+        if order.order_id in self.hang:
+            self.hung = True
+            raise TimeoutError("Colvir is not responding")
+        if order.order_id in self.fail:
+            raise RuntimeError(f"{order.order_id} failed")
+        return {
+            "№ Приказа": order.order_id,
+            "Статус": "Исполнен",
+            "Отработан роботом": "Да",
+        }
+
+    def restart(self) -> None:
+        self.restarts += 1
+        if self.restart_fails:
+            raise OSError("COLVIR.EXE did not start")
+        self.hung = False
+
+    def recover(self) -> None:
+        self.recoveries += 1
+        if self.restart_fails:
+            raise OSError("COLVIR.EXE did not start")
+
+    def run(self, order_ids: List[str], max_consecutive_failures: int = 3):
+        return order_queue.run_queue(
+            orders=[planned(order_id) for order_id in order_ids],
+            process=self.process,
+            is_hung=lambda: self.hung,
+            restart=self.restart,
+            recover=self.recover,
+            record=self.recorded.append,
+            max_consecutive_failures=max_consecutive_failures,
+        )
+
+
+def outcomes(report_data: List[Dict[str, str]]) -> Dict[str, str]:
+    return {
+        order_report["№ Приказа"]: order_report["Отработан роботом"]
+        for order_report in report_data
+    }
+
+
+def test_all_orders_posted():
+    colvir = FakeColvir()
+
+    report_data, stats = colvir.run(["1-I", "2-I", "3-I"])
+
+    assert outcomes(report_data) == {"1-I": "Да", "2-I": "Да", "3-I": "Да"}
+    assert len(stats.order_seconds) == 3
+    assert stats.failures == 0
+    assert colvir.recorded == report_data
+
+
+def test_stops_after_consecutive_failures():
+    colvir = FakeColvir(fail={"1-I", "2-I", "3-I"})
+
+    report_data, stats = colvir.run(
+        ["1-I", "2-I", "3-I", "4-I", "5-I"], max_consecutive_failures=3
+    )
+
+    assert colvir.processed == ["1-I", "2-I", "3-I"]
+    assert colvir.recoveries == 2
+    assert stats.failures == 3
+    assert colvir.recorded == report_data
+    assert outcomes(report_data) == {
+        "1-I": "Нет. Ошибка: 1-I failed",
+        "2-I": "Нет. Ошибка: 2-I failed",
+        "3-I": "Нет. Ошибка: 3-I failed",
+        "4-I": "Нет. Обработка прервана после 3 ошибок подряд",
+        "5-I": "Нет. Обработка прервана после 3 ошибок подряд",
+    }
+
+
+def test_success_resets_consecutive_failures():
+    colvir = FakeColvir(fail={"1-I", "2-I", "4-I", "5-I"})
+
+    report_data, stats = colvir.run(
+        ["1-I", "2-I", "3-I", "4-I", "5-I", "6-I"],
+        max_consecutive_failures=3,
+    )
+
+    assert colvir.processed == ["1-I", "2-I", "3-I", "4-I", "5-I", "6-I"]
+    assert stats.failures == 4
+    assert outcomes(report_data)["3-I"] == "Да"
+    assert outcomes(report_data)["6-I"] == "Да"
+
+
+def test_hung_order_is_requeued_once():
+    colvir = FakeColvir(hang={"1-I"})
+
+    report_data, stats = colvir.run(["1-I", "2-I"])
+
+    assert colvir.processed == ["1-I", "2-I", "1-I"]
+    assert colvir.restarts == 2
+    assert colvir.recoveries == 0
+    assert stats.failures == 0
+    assert outcomes(report_data) == {"2-I": "Да", "1-I": "Нет. Colvir завис"}
+
+
+@pytest.mark.parametrize("fail, hang", [({"1-I"}, set()), (set(), {"1-I"})])
+def test_failed_restart_reports_remaining_queue(fail, hang):
+    colvir = FakeColvir(fail=fail, hang=hang, restart_fails=True)
+
+    report_data, _ = colvir.run(["1-I", "2-I", "3-I"])
+
+    assert colvir.processed == ["1-I"]
+    assert {
+        order_id: outcome
+        for order_id, outcome in outcomes(report_data).items()
+        if order_id != "1-I"
+    } == {
+        "2-I": f"Нет. {order_queue.INTERRUPTED}",
+        "3-I": f"Нет. {order_queue.INTERRUPTED}",
+    }
+    assert sorted(
+        order_report["№ Приказа"] for order_report in report_data
+    ) == ["1-I", "2-I", "3-I"]
+
+
+def test_every_outcome_is_recorded(tmp_path):
+    cache = status_cache.StatusCache(
+        db_path=str(tmp_path / "status_cache.sqlite3"),
+        reverify_after=timedelta(hours=1),
+    )
+    now = datetime.now()
+    colvir = FakeColvir(fail={"2-I", "3-I"}, hang={"4-I"})
+
+    def record(order_report):
+        cache.update(
+            order_id=order_report["№ Приказа"],
+            status=order_report["Статус"],
+            outcome=order_report["Отработан роботом"],
+            now=now,
+        )
+
+    report_data, _ = order_queue.run_queue(
+        orders=[planned(order_id) for order_id in ["1-I", "2-I", "3-I", "4-I"]],
+        process=colvir.process,
+        is_hung=lambda: colvir.hung,
+        restart=colvir.restart,
+        recover=colvir.recover,
+        record=record,
+        max_consecutive_failures=2,
+    )
+
+    for order_id, outcome in outcomes(report_data).items():
+        assert cache.get(order_id).outcome == outcome
+    assert cache.should_skip("1-I", now) is not None
+    assert all(
+        cache.should_skip(order_id, now) is None
+        for order_id in ["2-I", "3-I", "4-I"]
+    )
+    cache.close()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import psutil
+import pytest
+
+import src.process_utils as process_utils
+
+TIMEOUT = 2.0
+
+posix_only = pytest.mark.skipif(
+    os.name != "posix", reason="relies on SIGTERM and reparenting"
+)
+
+IGNORE_SIGTERM = (
+    "import signal, sys, time; "
+    "signal.signal(signal.SIGTERM, signal.SIG_IGN); "
+    "sys.stdout.write('ready\\n'); sys.stdout.flush(); "
+    "time.sleep(60)"
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    process_utils.registry.processes.clear()
+    yield
+    process_utils.registry.processes.clear()
+
+
+def spawn_sleeper() -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(60)"]
+    )
+
+
+def is_gone(pid: int) -> bool:
+    try:
+        return psutil.Process(pid).status() == psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return True
+
+
+def assert_gone(pids, deadline: float) -> None:
+    assert all(is_gone(pid) for pid in pids)
+    assert time.monotonic() <= deadline
+
+
+def test_kill_tracked_children_within_timeout():
+    children = [spawn_sleeper() for _ in range(3)]
+    for child in children:
+        process_utils.registry.register(child.pid)
+
+    start = time.monotonic()
+    process_utils.kill_all_processes("no-such-process", timeout=TIMEOUT)
+    elapsed = time.monotonic() - start
+
+    for child in children:
+        child.wait(timeout=1)
+    assert elapsed < TIMEOUT
+    assert_gone([child.pid for child in children], start + TIMEOUT)
+    assert not process_utils.registry.processes
+
+
+@posix_only
+def test_kill_child_ignoring_sigterm_after_timeout(caplog):
+    child = subprocess.Popen(
+        [sys.executable, "-c", IGNORE_SIGTERM], stdout=subprocess.PIPE
+    )
+    assert child.stdout.readline().strip() == b"ready"
+    process_utils.registry.register(child.pid)
+
+    start = time.monotonic()
+    process_utils.kill_all_processes("no-such-process", timeout=TIMEOUT)
+    elapsed = time.monotonic() - start
+
+    assert f"Process {child.pid} did not terminate" in caplog.text
+    assert TIMEOUT <= elapsed < 2 * TIMEOUT
+    assert_gone([child.pid], start + 2 * TIMEOUT)
+    child.wait(timeout=1)
+
+
+@posix_only
+def test_scan_for_orphans_of_dead_launcher(tmp_path):
+    name = "colvirdummy"
+    dummy = tmp_path / name
+    shutil.copy(shutil.which("sleep"), dummy)
+
+    launcher = subprocess.Popen(
+        ["sh", "-c", f"sleep 0.5; {dummy} 60 & echo $!"],
+        stdout=subprocess.PIPE,
+    )
+    process_utils.registry.register(launcher.pid)
+    orphan_pid = int(launcher.stdout.readline())
+    launcher.wait(timeout=5)
+    assert orphan_pid not in process_utils.registry.processes
+
+    start = time.monotonic()
+    process_utils.kill_all_processes(name, timeout=TIMEOUT)
+
+    assert_gone([orphan_pid], start + TIMEOUT)
@@ -0,0 +1,65 @@
+import src.data as data
+import src.reconcile as reconcile
+
+
+def row(name: str, sum_tenge: str) -> data.Row:
+    return data.Row(
+        name=name,
+        name_num_date=f"{name} №1 от 01.01.24",
+        sum_tenge=sum_tenge,
+        currency="KZT",
+        debt_type="1",
+    )
+
+
+ROWS = [
+    row("Суточные", "12 000,00"),
+    row("Проживание в гостинице Казахстан", "45000.50"),
+    row("Проезд", "8000"),
+]
+
+
+def test_all_positions_saved():
+    grid_rows = [
+        {"Наименование": "Суточные", "Сумма": "12000.00", "Кол-во": "1"},
+        {"Наименование": "Проезд", "Сумма": "8 000,00", "Кол-во": "1"},
+        {
+            "Наименование": "Проживание в гостинице Казахстан",
+            "Сумма": "45000.50",
+            "Кол-во": "1",
+        },
+    ]
+
+    assert reconcile.missing_positions(grid_rows, ROWS) == []
+
+
+def test_reformatted_and_truncated_names_match():
+    grid_rows = [
+        {"Наименование": " СУТОЧНЫЕ ", "Сумма": "12000"},
+        {"Наименование": "Проживание  в гостин", "Сумма": "45 000,50"},
+        {"Наименование": "проезд", "Сумма": "8000.00"},
+    ]
+
+    assert reconcile.missing_positions(grid_rows, ROWS) == []
+
+
+def test_missing_and_wrong_amount():
+    grid_rows = [
+        {"Наименование": "Суточные", "Сумма": "12000"},
+        {"Наименование": "Проезд", "Сумма": "800"},
+    ]
+
+    assert reconcile.missing_positions(grid_rows, ROWS) == [1, 2]
+
+
+def test_short_prefix_does_not_match():
+    grid_rows = [{"Наименование": "Про", "Сумма": "8000"}]
+
+    assert reconcile.missing_positions(grid_rows, ROWS[2:]) == [0]
+
+
+def test_each_grid_row_matches_once():
+    rows = [row("Суточные", "6000"), row("Суточные", "6000")]
+    grid_rows = [{"Наименование": "Суточные", "Сумма": "6000"}]
+
+    assert reconcile.missing_positions(grid_rows, rows) == [1]
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+import src.references as references
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    mirror = references.References(
+        references_json_path=str(tmp_path / "references.json"),
+        max_age=timedelta(hours=1),
+    )
+    mirror.update(references.CURRENCIES, {"KZT", "USD", "EUR"}, "export")
+    mirror.unknown(references.CURRENCIES, np.array(["KZT", " usd", "RUB"]))
+    return mirror
+
+
+def test_refresh_replaces_codes(mirror):
+    assert mirror.refresh(references.CURRENCIES, {"KZT", "USD"}, "colvir")
+
+    dictionary = mirror.dictionaries[references.CURRENCIES]
+    assert dictionary.codes == {"KZT", "USD"}
+    assert dictionary.source == "colvir"
+
+
+def test_partial_refresh_keeps_mirror(mirror, caplog):
+    assert not mirror.refresh(references.CURRENCIES, {"KZT", "EUR"}, "colvir")
+
+    dictionary = mirror.dictionaries[references.CURRENCIES]
+    assert dictionary.codes == {"KZT", "USD", "EUR"}
+    assert dictionary.source == "export"
+    assert "['USD']" in caplog.text
+
+
+def test_refresh_of_wrong_column_keeps_mirror(mirror):
+    assert not mirror.refresh(
+        references.CURRENCIES, {"ТЕНГЕ", "ДОЛЛАР США"}, "colvir"
+    )
+
+    reloaded = references.References(
+        mirror.references_json_path, max_age=timedelta(hours=1)
+    )
+    assert reloaded.dictionaries[references.CURRENCIES].codes == {
+        "KZT",
+        "USD",
+        "EUR",
+    }
+
+
+def test_refresh_of_new_dictionary(mirror):
+    assert mirror.refresh(references.BRANCHES, {"001"}, "colvir")
+
+    assert mirror.dictionaries[references.BRANCHES].codes == {"001"}
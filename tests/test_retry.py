@@ -0,0 +1,152 @@
+import pytest
+
+import src.retry as retry
+
+
+class FakeTime:
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Flaky:
+    def __init__(self, failures: int, error: Exception) -> None:
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(retry, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def policy(monkeypatch):
+    policy = retry.Policy(
+        attempts=3,
+        base_delay=1.0,
+        max_delay=10.0,
+        budget=100.0,
+        jitter=0.0,
+        breaker_threshold=2,
+        breaker_reset=60.0,
+    )
+    monkeypatch.setitem(retry.POLICIES, "test", policy)
+    retry.reset("test")
+    retry.reset_stats()
+    yield policy
+    retry.reset("test")
+    retry.reset_stats()
+
+
+def test_retries_until_success(clock, policy):
+    func = Flaky(failures=2, error=ConnectionError("reset"))
+
+    assert retry.call("test", func, retry_on=(ConnectionError,)) == "ok"
+
+    assert func.calls == 3
+    assert clock.sleeps == [1.0, 2.0]
+    assert retry.summary()["test"]["retries"] == 2
+
+
+def test_gives_up_after_attempts(clock, policy):
+    func = Flaky(failures=10, error=ConnectionError("reset"))
+
+    with pytest.raises(retry.RetryError, match="after 3 attempts"):
+        retry.call("test", func, retry_on=(ConnectionError,))
+
+    assert func.calls == policy.attempts
+    assert retry.summary()["test"]["failures"] == 1
+
+
+def test_gives_up_when_budget_is_spent(clock, policy):
+    policy.attempts = 10
+    policy.base_delay = 10.0
+    policy.max_delay = 100.0
+    policy.budget = 25.0
+    func = Flaky(failures=10, error=ConnectionError("reset"))
+
+    with pytest.raises(retry.RetryError, match="after 2 attempts"):
+        retry.call("test", func, retry_on=(ConnectionError,))
+
+    assert clock.sleeps == [10.0]
+
+
+def test_give_up_errors_are_not_retried(clock, policy):
+    func = Flaky(failures=10, error=PermissionError("denied"))
+
+    with pytest.raises(PermissionError):
+        retry.call(
+            "test", func, retry_on=(OSError,), give_up=(PermissionError,)
+        )
+
+    assert func.calls == 1
+    assert clock.sleeps == []
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = retry.CircuitBreaker(threshold=2, reset_after=60.0)
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.sleep(60.0)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.sleep(60.0)
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_open_circuit_fails_fast(clock, policy):
+    for _ in range(policy.breaker_threshold):
+        with pytest.raises(retry.RetryError):
+            retry.call(
+                "test",
+                Flaky(failures=10, error=ConnectionError("reset")),
+                retry_on=(ConnectionError,),
+            )
+
+    func = Flaky(failures=0, error=ConnectionError("reset"))
+    with pytest.raises(retry.CircuitOpen):
+        retry.call("test", func, retry_on=(ConnectionError,))
+    assert func.calls == 0
+    assert retry.summary()["test"]["rejected"] == 1
+
+    clock.sleep(policy.breaker_reset)
+    assert retry.call("test", func, retry_on=(ConnectionError,)) == "ok"
+    assert retry.get_breaker("test").state == "closed"
+
+
+def test_reset_stats(clock, policy):
+    retry.call("test", Flaky(failures=0, error=ConnectionError()))
+    assert "test" in retry.summary()
+
+    retry.reset_stats()
+
+    assert retry.summary() == {}
@@ -0,0 +1,110 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+import src.watchdog as watchdog
+
+INTERVAL = 0.1
+
+
+def detection_time(colvir_watchdog, samples, interval=INTERVAL):
+    now = 0.0
+    for sample in samples:
+        if colvir_watchdog.is_dead(sample, now):
+            return now
+        now += interval
+    return None
+
+
+def test_idle_hang_detected_within_idle_timeout():
+    colvir_watchdog = watchdog.ColvirWatchdog(
+        pid=0, hang_timeout=30.0, idle_hang_timeout=2.0
+    )
+    hung = watchdog.Sample(alive=True, responsive=False, cpu_percent=0.0)
+
+    detected = detection_time(colvir_watchdog, [hung] * 1000)
+
+    assert detected is not None
+    assert 2.0 <= detected <= 2.0 + INTERVAL
+
+
+def test_busy_hang_detected_within_hang_timeout():
+    colvir_watchdog = watchdog.ColvirWatchdog(
+        pid=0, hang_timeout=5.0, idle_hang_timeout=2.0
+    )
+    busy = watchdog.Sample(alive=True, responsive=False, cpu_percent=90.0)
+
+    detected = detection_time(colvir_watchdog, [busy] * 1000)
+
+    assert detected is not None
+    assert 5.0 <= detected <= 5.0 + INTERVAL
+
+
+def test_busy_but_responsive_is_not_flagged():
+    colvir_watchdog = watchdog.ColvirWatchdog(
+        pid=0, hang_timeout=5.0, idle_hang_timeout=2.0
+    )
+    samples = [
+        watchdog.Sample(alive=True, responsive=True, cpu_percent=100.0),
+        watchdog.Sample(alive=True, responsive=False, cpu_percent=100.0),
+    ] * 500
+
+    assert detection_time(colvir_watchdog, samples) is None
+
+
+def test_dead_process_detected_immediately():
+    colvir_watchdog = watchdog.ColvirWatchdog(pid=0)
+    dead = watchdog.Sample(alive=False, responsive=False)
+
+    assert detection_time(colvir_watchdog, [dead]) == 0.0
+
+
+class UnresponsiveWatchdog(watchdog.ColvirWatchdog):
+    def is_responsive(self) -> bool:
+        return False
+
+    def on_hang(self, sample: watchdog.Sample) -> None:
+        self.detected_at = time.monotonic()
+        self.hung.set()
+
+
+def test_simulated_hang_of_dummy_process():
+    child = subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(60)"]
+    )
+    try:
+        colvir_watchdog = UnresponsiveWatchdog(
+            pid=child.pid,
+            interval=INTERVAL,
+            hang_timeout=5.0,
+            idle_hang_timeout=0.5,
+        )
+        start = time.monotonic()
+        colvir_watchdog.start()
+
+        assert colvir_watchdog.hung.wait(timeout=0.5 + 5 * INTERVAL + 1)
+        assert colvir_watchdog.detected_at - start <= 0.5 + 5 * INTERVAL
+        colvir_watchdog.stop()
+    finally:
+        child.kill()
+        child.wait()
+
+
+def test_windowless_process_is_responsive():
+    pytest.importorskip("win32gui")
+    child = subprocess.Popen(
+        [sys.executable, "-c", "import time; time.sleep(60)"]
+    )
+    try:
+        colvir_watchdog = watchdog.ColvirWatchdog(pid=child.pid)
+
+        sample = colvir_watchdog.sample()
+
+        assert sample.alive
+        assert sample.responsive
+        assert not colvir_watchdog.is_dead(sample, time.monotonic())
+    finally:
+        child.kill()
+        child.wait()